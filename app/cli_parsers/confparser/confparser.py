@@ -35,6 +35,9 @@ cidr_l   : Convert string to CIDR format and then to list unconditionally
 bool     : Sets the value to False if the line starts with 'no' or else to True
 decrypt7 : Decrypts a Cisco type 7 password
 
+Actions are resolved when a dissector is compiled. Results of cidr, expand,
+expand_f, expand_h and decrypt7 are kept in a bounded LRU memo.
+
 Supported groupings are:
 implicit : Create list of branches when key is duplicate.
 explicit : Create list of branches unconditionally.
@@ -50,22 +53,161 @@ that reference the dissector and source file used. A dissector can be created
 from a string or a file and can parse an iterable, a string or a file. Multiple
 dissectors can be registered to the AutoDissector which uses hints to match a
 dissector to a file. A hint is a regular expression that is unique to the first
-23 lines of a file.
+23 lines of a file. If the first line with a match matches several hints, the
+dissector that was registered first is used. Hints are searched with a single
+combined regex unless a hint has global inline flags or group references.
+
+The parse methods accept compact=True to return a Tree with plain dict branches
+without parent references, in which equal keys and strings share one instance.
+Such a tree uses less memory and has no reference cycles for the garbage
+collector to track. The plain dicts are built while parsing, which takes no more
+memory at its peak than a normal parse, but sharing strings takes more time.
+
+Dissector.parse_str_incremental takes the string and the Tree it returned for a
+previous version of the string. Only top level blocks, which start at lines
+without indentation, that changed are parsed again. With indent=0, top level
+blocks end at an end of block marker instead. The parts of the Tree that the
+changed blocks touch, which are branches up to three keys deep, are rebuilt
+from all blocks that touch them. Other parts are copied from the previous Tree,
+which is left as it is.
+
+Dissector.from_file_cached returns the same compiled dissector for a file until
+its contents change. With cache_dir the loaded YAML is also kept on disk with
+marshal, which saves YAML parsing in new processes.
+
+The parse_many method of the AutoDissector parses many files in a pool of
+worker processes and generates (filename, Tree or exception) pairs as soon as
+they are parsed. Functions registered with register_map must be picklable.
+
+Files that end with .gz, .bz2, .xz, .lzma or .zst (which needs the zstandard
+package) are decompressed while they are read by Dissector.parse_file,
+MultiDissector.parse_file and AutoDissector.from_file. The open_file function
+opens such files as text, so their lines can be passed to any parse method. The
+iter_archive function generates the name and an iterator of lines of each file
+in a zip file or a tar file, which may be compressed as well. A tar file is read
+as a stream, so the lines of each member must be consumed before the next
+member is generated.
+AutoDissector.from_archive parses each file in an archive with the dissector
+that its hints match.
+
+Dissector.parse_file and Dissector.iter_events_file accept use_mmap=True to
+memory map the file instead of reading it as text. Lines are found in the
+mapped bytes and matched where they are with bytes versions of the regexes,
+and only captured groups are decoded. Text lines are matched at the offset of
+their block level as well instead of being sliced. Compressed or empty files,
+files that are not plain ASCII with regular line endings and dissectors that
+are not plain ASCII are read as text.
+
+The MultiDissector takes several dissectors and parses a document with all of
+them in a single pass. Every line is read and stripped once and then fed to
+each dissector, which keeps track of its own block level. Its parse methods
+return a list with a Tree for each dissector.
+
+The iter_events methods of the Dissector class parse without building a Tree.
+They return a generator of Event tuples (kind, path, key, value), where path is
+a tuple of keys from the root to the branch the event applies to:
+enter    : A child block is opened at path. Key holds the additional keys that
+           reference the same block and value holds the named groups.
+exit     : The child block at path is closed.
+value    : Key and value are merged into the branch at path.
+item     : Value is appended to the list of key in the branch at path.
+leaf     : Value is added as leaf to key in the branch at path.
+branch   : The branch at path is created if it does not exist. Value is the
+           empty dict when no named groups were merged into it and None when
+           the branch was only looked up.
+The build_tree function turns events into the same Tree that parse returns.
+
+Dissector.profile returns a Profile. While the Profile is entered with a 'with'
+statement, the dissector records for each item the number of attempts, matches
+and the time spent in its regex and actions. Profile.report lists the slowest
+items and items that never matched. Profiling is off otherwise and then costs
+nothing. Worker processes of parse_many are not profiled.
+
+Tree.dump writes a Tree to a text stream as compact JSON or, with lines=True, as
+JSON Lines with one object per block. Branches that only hold branches or
+lists, such as all interfaces, access lists or DHCP scopes, are split into their
+blocks, and each line holds the path from the root to one block. Blocks are
+encoded one at a time, so the whole document never exists as a single string.
+The orjson encoder is used if it is installed.
 """
 
 # Author: Tim Dorssers
 
+import os
 import re
+import bz2
+import codecs
+import gzip
 import json
+import lzma
+import locale
+import marshal
+import mmap
+import hashlib
+import bisect
+import functools
 import itertools
+import time
+import collections
+import concurrent.futures
 import ipaddress
+import tarfile
+import zipfile
 import yaml
 
+try:
+    from re import _parser as sre_parse  # Python 3.11+
+except ImportError:
+    import sre_parse
+
+try:
+    import orjson  # Faster JSON encoder if installed
+except ImportError:
+    orjson = None
+
+try:
+    import zstandard  # Needed to read .zst files only
+except ImportError:
+    zstandard = None
+
+# Kinds of events generated while dissecting a document
+ENTER, EXIT, VALUE, ITEM, LEAF, BRANCH = (
+    'enter', 'exit', 'value', 'item', 'leaf', 'branch')
+
+Event = collections.namedtuple('Event', 'kind path key value')
+
+# Compiled dissectors by filename and name, see Dissector.from_file_cached
+_dissectors = {}
+
+# Carriage return that ends a line in text mode, see _plain_ascii
+_LONE_CR = re.compile(rb'\r(?!\n)')
+
+# Size of the parts of a memory mapped file that are checked at once
+_CHUNK_SIZE = 1 << 20
+
+# Precompiled patterns of actions
+_EXPAND_SPLIT = re.compile(', *').split
+_EXPAND_RANGE = re.compile(r'([A-Za-z0-9/]*?)(\d+)\s*-\s*\1?(\d+)').match
+_EXPAND_F_PORTS = re.compile(r'ethe(?:rnet)? (\S+(?: to )?\S+)').findall
+_EXPAND_F_RANGE = re.compile(r'(\S+\/)(\d+) to \S+\/(\d+)').match
+_EXPAND_H_SPLIT = re.compile('(?<!to) (?!to)').split
+_EXPAND_H_RANGE = re.compile(r'(\d+) to (\d+)').match
+_DECRYPT7 = re.compile('(^[0-9A-Fa-f]{2})([0-9A-Fa-f]+)').search
+
+# Maximum number of results kept per memoized action
+_MEMO_SIZE = 4096
+
+# Number of keys in paths of the parts of a Tree that parse_str_incremental
+# rebuilds, a path that ends with Ellipsis only makes sure the branch exists
+_UNIT_DEPTH = 3
+
+# Compact JSON encoder used by Tree.dump when orjson is not installed
+_encoder = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'))
 
 class Tree(dict):
     """ Autovivificious dictionary with parent property as tree stucture """
 
-    __slots__ = 'parent', 'parser', 'source'
+    __slots__ = 'parent', 'parser', 'source', 'blocks'
 
     def __init__(self, parent=None):
         """ Initialize self """
@@ -73,6 +215,7 @@ class Tree(dict):
         if parent is None:
             self.parser = None
             self.source = None
+            self.blocks = None  # Index of top level blocks for re-parsing
 
     def __missing__(self, key):
         """ Implement self[key] when key is not in the dictionary """
@@ -83,18 +226,42 @@ class Tree(dict):
         """ Serialize dictionary to JSON formatted string with indents """
         return json.dumps(self, indent=4)
 
+    def dump(self, fp, lines=False):
+        """ Write compact JSON or JSON Lines to text stream block by block """
+        if not lines:
+            _write_branch(fp, self)
+            return
+        for path, value in _iter_blocks(self, ()):
+            # Nest block in the keys of its path
+            for key in reversed(path):
+                value = {key: value}
+            fp.write(_encode(value) + '\n')
+
     def merge_retain(self, other):
         """ Update dict with other and concatenate values of existing keys """
         for key in other.keys():
-            if key in self:
-                # Make sure value is a list
-                v = other[key] if isinstance(other[key], list) else [other[key]]
-                if isinstance(self[key], list):
-                    self[key] += v  # Append value to list
-                else:
-                    self[key] = [self[key]] + v  # Make list and append value
+            self.merge_value(key, other[key])
+
+    def merge_value(self, key, value):
+        """ Set value of key or concatenate value if key exists """
+        if key in self:
+            values = self[key]
+            if type(values) is not _Values:
+                # Make list that can be extended in place on further merges
+                values = self[key] = _Values(
+                    values if isinstance(values, list) else [values])
+            if isinstance(value, list):
+                values.extend(value)
             else:
-                self[key] = other[key]
+                values.append(value)
+        else:
+            self[key] = value
+
+
+class _Values(list):
+    """ List of values that is owned by a tree and extended in place """
+
+    __slots__ = ()
 
 
 class Dissector(object):
@@ -103,12 +270,17 @@ class Dissector(object):
     def __init__(self, stream, name=None):
         """ Initialize self """
         self.name = name  # Optional name of dissector
-        self.context = yaml.safe_load(stream)
-        self._compile_dissector(self.context)
+        self._load(yaml.safe_load(stream))
+
+    def _load(self, context):
+        """ Compile loaded YAML document and store its content hash """
+        self.digest = hashlib.sha256(repr(context).encode()).hexdigest()
+        self.context = self._compile_dissector(context)
 
     def _compile_dissector(self, context):
-        """ Compile regular expressions in dissector """
-        context = [context] if not isinstance(context, list) else context
+        """ Compile regular expressions and dispatch index in dissector """
+        context = _Block([context] if not isinstance(context, list)
+                         else context)
         for item in context:
             if 'match' in item:
                 item['prog'] = re.compile(item['match'])
@@ -116,9 +288,19 @@ class Dissector(object):
                 item['prog'] = re.compile(item['search'])
             else:
                 raise KeyError("Missing 'match' or 'search' key")
+            # Lines are matched at the offset of their text, which anchors
+            # and lookbehinds of these patterns must not see before
+            item['sliced'] = _looks_back(
+                sre_parse.parse(item['prog'].pattern, item['prog'].flags))
+            # Resolve actions to callables once
+            item['action_func'] = _bind_action(item.get('action'))
+            item['actionall_func'] = _bind_action(item.get('actionall'))
             # Parse child using recursion
             if 'child' in item:
-                self._compile_dissector(item['child'])
+                item['child'] = self._compile_dissector(item['child'])
+        context.build_index()
+        context.build_binary()
+        return context
 
     @classmethod
     def from_file(cls, filename, **kwargs):
@@ -127,6 +309,28 @@ class Dissector(object):
             buf = f.read()
         return cls(buf, **kwargs)
 
+    @classmethod
+    def from_file_cached(cls, filename, cache_dir=None, name=None):
+        """ Alternate constructor that reuses dissectors of unchanged files """
+        path = os.path.abspath(filename)
+        stat = os.stat(path)
+        entry = _dissectors.get((path, name))
+        # Skip hashing when size and modification time did not change
+        if entry and entry[:2] == (stat.st_mtime_ns, stat.st_size):
+            return entry[3]
+        with open(path, 'rb') as f:
+            buf = f.read()
+        digest = hashlib.sha256(buf).hexdigest()
+        if entry and entry[2] == digest:
+            dissector = entry[3]
+        else:
+            dissector = cls.__new__(cls)
+            dissector.name = name
+            dissector._load(_load_yaml(buf, digest, cache_dir))
+        _dissectors[(path, name)] = (stat.st_mtime_ns, stat.st_size, digest,
+                                     dissector)
+        return dissector
+
     def parse(self, lines, **kwargs):
         """ Return a Tree object that contains the parsed iterable """
         tree = _parse(lines, self.context, **kwargs)
@@ -139,12 +343,403 @@ class Dissector(object):
         tree.parser = self
         return tree
 
-    def parse_file(self, filepath, **kwargs):
+    def parse_str_incremental(self, string, tree=None, indent=1, eob=None,
+                              eof='end'):
+        """ Return a Tree object of the string, re-parsing changed blocks """
+        pieces = _split_blocks(string.splitlines(), indent, eob, eof)
+        digests = [hashlib.blake2b('\n'.join(piece).encode(),
+                                   digest_size=16).digest()
+                   for piece in pieces]
+        signature = (self.digest, indent, eob, eof)
+        if tree is None or not tree.blocks or tree.blocks[0] != signature:
+            # No usable index, so every block is new
+            old, tree = [], Tree()
+        else:
+            old = tree.blocks[1]
+        matches = _align_blocks([r[0] for r in old], digests)
+        # Parts of removed blocks need to be rebuilt
+        removed = [old[i] for i in set(range(len(old))).difference(matches)]
+        changed = {unit for record in removed for unit in record[1]}
+        records, blocks, events = [], [], {}
+        j = 0
+        while j < len(pieces):
+            if matches[j] is not None:
+                records.append(old[matches[j]])
+                blocks.append(pieces[j])
+                j += 1
+                continue
+            # Parse new piece and, without indentation, the following pieces
+            # until the block is closed
+            start, sink = j, _EventSink()
+            cursor = _Cursor(self.context, sink, indent, eob)
+            while True:
+                for line in pieces[j]:
+                    cursor.feed(line, 0, len(line))
+                j += 1
+                if indent or not cursor.level or j == len(pieces):
+                    break
+                if matches[j] is not None:
+                    changed.update(old[matches[j]][1])
+            digest = digests[start]
+            if j - start > 1 or cursor.level and not indent:
+                # Never reused, as no single piece has this digest
+                digest = hashlib.blake2b(b''.join(digests[start:j]),
+                                         digest_size=16).digest()
+            cursor.close()
+            events[len(records)] = sink.events
+            records.append((digest,) + _block_units(sink.events))
+            blocks.append([line for piece in pieces[start:j]
+                           for line in piece])
+            changed.update(records[-1][1])
+        # Parts with values or references are rebuilt as a whole
+        wholes = {unit for record in records + removed for unit in record[1]
+                  if len(unit) < _UNIT_DEPTH and unit[-1] is not ...}
+        affected = {_coarsen(unit, wholes) for unit in changed}
+        # Blocks with references between parts are rebuilt together
+        linked = [{_coarsen(unit, wholes) for unit in record[1]}
+                  for record in records + old if record[2]]
+        grown = True
+        while grown:
+            grown = False
+            for units in linked:
+                if affected & units and not affected >= units:
+                    affected |= units
+                    grown = True
+        # Replay events of all blocks that change rebuilt parts, branches
+        # that only have to exist are created by _splice
+        rebuilt = {unit for unit in affected if unit[-1] is not ...}
+        keys = {unit[0] for unit in rebuilt}
+        touched = (events[j] if j in events else
+                   _dissect(iter(blocks[j]), self.context, indent, eob, eof)
+                   for j, record in enumerate(records)
+                   if any(unit[0] in keys and _coarsen(unit, wholes) in rebuilt
+                          for unit in record[1]))
+        branches = build_tree(_filter_events(touched, affected, wholes))
+        result = _splice(records, affected, branches, tree)
+        result.parser = self
+        result.blocks = (signature, records)
+        return result
+
+    def parse_file(self, filepath, use_mmap=False, **kwargs):
         """ Return a Tree object that contains the parsed file contents """
-        with open(filepath) as f:
-            tree = _parse(f, self.context, **kwargs)
-            tree.parser = self
-            return tree
+        buf = _map_file(filepath, self.context) if use_mmap else None
+        if buf is None:
+            with open_file(filepath) as f:
+                tree = _parse(f, self.context, **kwargs)
+        else:
+            with buf:
+                tree = _parse_mapped(buf, self.context.binary, **kwargs)
+        tree.parser = self
+        return tree
+
+    def iter_events(self, lines, **kwargs):
+        """ Return a generator of events for the parsed iterable """
+        return _dissect(lines, self.context, **kwargs)
+
+    def iter_events_str(self, string, **kwargs):
+        """ Return a generator of events for the parsed string """
+        return _dissect(iter(string.splitlines()), self.context, **kwargs)
+
+    def iter_events_file(self, filepath, use_mmap=False, **kwargs):
+        """ Return a generator of events for the parsed file contents """
+        return _dissect_file(filepath, self.context, use_mmap, **kwargs)
+
+    def profile(self):
+        """ Return Profile that records rule statistics while it is entered """
+        return Profile(self)
+
+
+def _load_yaml(buf, digest, cache_dir=None):
+    """ Return YAML document from disk cache or parse and store it """
+    if cache_dir is None:
+        return yaml.safe_load(buf)
+    # marshal only stores plain values, so loading a cache file runs no code
+    path = os.path.join(cache_dir, digest + '.marshal')
+    try:
+        with open(path, 'rb') as f:
+            return marshal.load(f)
+    except Exception:
+        # On any load error, ignore cache
+        pass
+    context = yaml.safe_load(buf)
+    try:
+        data = marshal.dumps(context)
+    except ValueError:
+        # Timestamps and other values that marshal cannot store are not cached
+        return context
+    tmp_path = path + '.%d.tmp' % os.getpid()
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        # Replace atomically as other processes may read the same cache
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except OSError:
+        # An unwritable cache only costs the YAML parsing next time
+        pass
+    return context
+
+
+class Profile(object):
+    """ Records attempts, matches and time of each rule of a dissector """
+
+    def __init__(self, dissector):
+        """ Initialize self with statistics for every dissector item """
+        self.dissector = dissector
+        self.rules = []
+        self._items = []  # Tuples of block, position and statistics
+        self._saved = None
+        self._add_rules(dissector.context, ())
+
+    def _add_rules(self, block, path):
+        """ Add statistics of items in block and its child blocks """
+        for pos, item in enumerate(block):
+            rule = RuleStats(path, item.get('match', item.get('search')))
+            self.rules.append(rule)
+            self._items.append((block, pos, rule))
+            if block.binary is not None:
+                self._items.append((block.binary, pos, rule))
+            if 'child' in item:
+                self._add_rules(item['child'], path + (rule.pattern,))
+
+    def __enter__(self):
+        """ Replace regexes and actions of the dissector by timed ones """
+        if self._saved is not None:
+            raise RuntimeError('Profile is already entered')
+        self._saved = []
+        for block, pos, rule in self._items:
+            item = block[pos]
+            self._saved.append((item, dict(item)))
+            item['prog'] = _TimedRegex(item['prog'], rule)
+            for name in ('action_func', 'actionall_func'):
+                if item[name] is not None:
+                    item[name] = _TimedAction(item[name], rule)
+        return self
+
+    def __exit__(self, *exc_info):
+        """ Restore regexes and actions of the dissector """
+        for item, saved in self._saved:
+            item.update(saved)
+        self._saved = None
+
+    def slowest(self, count=10):
+        """ Return statistics of rules that took the most time """
+        return sorted(self.rules, key=lambda rule: rule.total_time,
+                      reverse=True)[:count]
+
+    def unmatched(self):
+        """ Return statistics of rules that never matched """
+        return [rule for rule in self.rules if not rule.matches]
+
+    def report(self, count=10):
+        """ Return table of the slowest rules and rules that never matched """
+        lines = ['%10s %10s %10s %10s  %s' % (
+            'attempts', 'matches', 'regex ms', 'action ms', 'rule')]
+        for rule in self.slowest(count):
+            lines.append(rule.format())
+        lines.append('')
+        lines.append('Never matched:')
+        lines.extend(rule.format() for rule in self.unmatched())
+        return '\n'.join(lines)
+
+
+class RuleStats(object):
+    """ Statistics of one dissector item identified by its nesting path """
+
+    __slots__ = ('path', 'pattern', 'attempts', 'matches', 'regex_time',
+                 'action_time')
+
+    def __init__(self, path, pattern):
+        """ Initialize self """
+        self.path = path
+        self.pattern = pattern
+        self.attempts = 0
+        self.matches = 0
+        self.regex_time = 0.0
+        self.action_time = 0.0
+
+    @property
+    def total_time(self):
+        """ Time spent in regexes and actions of the rule """
+        return self.regex_time + self.action_time
+
+    def format(self):
+        """ Return statistics as line of the profile report """
+        return '%10d %10d %10.3f %10.3f  %s' % (
+            self.attempts, self.matches, self.regex_time * 1000,
+            self.action_time * 1000, ' > '.join(self.path + (self.pattern,)))
+
+
+class _TimedMatch(object):
+    """ Regex method that counts attempts and matches and adds its time """
+
+    __slots__ = 'method', 'rule'
+
+    def __init__(self, method, rule):
+        """ Initialize self """
+        self.method = method
+        self.rule = rule
+
+    def __call__(self, *args):
+        """ Call regex method and record statistics """
+        start = time.perf_counter()
+        m = self.method(*args)
+        rule = self.rule
+        rule.regex_time += time.perf_counter() - start
+        rule.attempts += 1
+        if m is not None:
+            rule.matches += 1
+        return m
+
+
+class _TimedRegex(object):
+    """ Compiled regex with timed match and search methods """
+
+    __slots__ = 'match', 'search'
+
+    def __init__(self, prog, rule):
+        """ Initialize self """
+        self.match = _TimedMatch(prog.match, rule)
+        self.search = _TimedMatch(prog.search, rule)
+
+
+class _TimedAction(object):
+    """ Action that adds its time to the statistics of a rule """
+
+    __slots__ = 'func', 'rule'
+
+    def __init__(self, func, rule):
+        """ Initialize self """
+        self.func = func
+        self.rule = rule
+
+    def __call__(self, value):
+        """ Call action and record time """
+        start = time.perf_counter()
+        result = self.func(value)
+        self.rule.action_time += time.perf_counter() - start
+        return result
+
+
+class _Block(list):
+    """ List of dissector items of one block level with a dispatch index """
+
+    __slots__ = 'prefixes', 'order', 'index', 'space', 'binary'
+
+    def build_index(self):
+        """ Index items by a trie of the words of their literal prefix """
+        self.prefixes = [_literal_prefix(item) for item in self]
+        self.order = tuple(range(len(self)))
+        # Only words that are followed by a space in the prefix are complete
+        words = [p.split(' ')[:-1] for p in self.prefixes]
+        self.index = _word_trie(words, self.order, 0)
+        self.space = ' '
+        self.binary = None
+
+    def build_binary(self):
+        """ Add copy of self that matches bytes unless a pattern cannot """
+        items = []
+        for item in self:
+            prog = item['prog']
+            try:
+                item = dict(item, prog=re.compile(prog.pattern.encode('ascii'),
+                                                  prog.flags & ~re.UNICODE))
+            except (UnicodeEncodeError, ValueError, re.error):
+                return
+            if 'child' in item:
+                if item['child'].binary is None:
+                    return
+                item['child'] = item['child'].binary
+            items.append(item)
+        binary = self.binary = _Block(items)
+        # A match of the regex already implies its literal prefix
+        binary.prefixes = [b''] * len(self)
+        binary.order = self.order
+        binary.index = _encode_trie(self.index)
+        binary.space = b' '
+        binary.binary = None
+
+    def select(self, buf, start, stop):
+        """ Return indices of items that can match text of buf, in order """
+        order, node, space = self.order, self.index, self.space
+        while node is not None:
+            end = buf.find(space, start, stop)
+            if end < 0:
+                end = stop
+            word, start = buf[start:end], end + 1
+            order, node = node[1].get(word, node[0])
+        return order
+
+
+def _word_trie(words, members, depth):
+    """ Return trie node of members by word at depth or None if it is no use """
+    # Members without a complete word at depth are candidates for any word
+    fallback = tuple(i for i in members if len(words[i]) <= depth)
+    groups = {}
+    for i in members:
+        if len(words[i]) > depth:
+            groups.setdefault(words[i][depth], []).append(i)
+    children = {}
+    for word, group in groups.items():
+        order = tuple(sorted(group + list(fallback)))
+        children[word] = order, _word_trie(words, order, depth + 1)
+    # A word that all members share only narrows at a deeper level
+    if not children or (not fallback and len(children) == 1 and
+                        next(iter(children.values()))[1] is None):
+        return None
+    return (fallback, None), children
+
+def _encode_trie(node):
+    """ Return copy of trie node with its words encoded as bytes """
+    if node is None:
+        return None
+    return node[0], {word.encode('utf-8'): (order, _encode_trie(child))
+                     for word, (order, child) in node[1].items()}
+
+def _literal_prefix(item):
+    """ Return the literal text any line matched by the item starts with """
+    prog = item['prog']
+    if 'match' not in item or prog.flags & re.IGNORECASE:
+        return ''
+    prefix, _ = _literal_head(sre_parse.parse(prog.pattern, prog.flags))
+    return prefix
+
+def _literal_head(pattern):
+    """ Collect leading literals of a parsed pattern and flag completeness """
+    prefix = []
+    for op, av in pattern:
+        if op is sre_parse.LITERAL:
+            prefix.append(chr(av))
+        elif op is sre_parse.SUBPATTERN and not av[1] and not av[2]:
+            # Descend into plain groups, such as named capture groups
+            head, complete = _literal_head(av[3])
+            prefix.append(head)
+            if not complete:
+                return ''.join(prefix), False
+        else:
+            return ''.join(prefix), False
+    return ''.join(prefix), True
+
+def _looks_back(pattern):
+    """ Return whether parsed pattern sees text before where it matches """
+    for op, av in pattern:
+        if op is sre_parse.AT and av in (sre_parse.AT_BEGINNING,
+                                         sre_parse.AT_BEGINNING_LINE,
+                                         sre_parse.AT_BEGINNING_STRING):
+            return True
+        if op in (sre_parse.ASSERT, sre_parse.ASSERT_NOT) and av[0] < 0:
+            return True
+        # Search subpatterns of groups, branches, repeats and assertions
+        stack = [av]
+        while stack:
+            value = stack.pop()
+            if isinstance(value, sre_parse.SubPattern):
+                if _looks_back(value):
+                    return True
+            elif isinstance(value, (tuple, list)):
+                stack.extend(value)
+    return False
+
 
 class AutoDissector(object):
     """ Handles automatic selection of parsers based on hints """
@@ -153,12 +748,14 @@ class AutoDissector(object):
         """ Initialize self """
         self.parsers = {}
         self.raise_no_match = raise_no_match
+        self._hints = None
 
     def register(self, dissector, hint, **kwargs):
         """ Register dissector object with hint regex and parser arguments """
         if not isinstance(dissector, Dissector):
             raise TypeError('Expected a dissector object')
         self.parsers[dissector] = {'hint': re.compile(hint), 'kwargs': kwargs}
+        self._hints = None  # Combine hints again on next lookup
 
     def register_map(self, dissector, function, hint, **kwargs):
         """ Register with function to apply to the parser iteratable """
@@ -167,191 +764,1078 @@ class AutoDissector(object):
 
     def from_file(self, filename):
         """ Return Tree object from matching parser for given file """
-        with open(filename) as f:
-            # Look for hint in first few lines of the file
-            for line in itertools.islice(f, 23):
-                for parser, param in self.parsers.items():
-                    if param['hint'].search(line):
-                        f.seek(0)
-                        if 'function' in param:
-                            # Apply function to iterable f
-                            tree = parser.parse(param['function'](f),
-                                                **param['kwargs'])
-                        else:
-                            tree = parser.parse(f, **param['kwargs'])
-                        tree.source = filename  # Save source filename
-                        return tree
+        with open_file(filename) as f:
+            # Look for hint in first few lines of the file and keep them, as
+            # decompressed streams cannot always seek back
+            head = list(itertools.islice(f, 23))
+            found = self._find_parser(head)
+            if found:
+                tree = self._parse(found, itertools.chain(head, f))
+                tree.source = filename  # Save source filename
+                return tree
         if self.raise_no_match:
             raise ValueError('None of the hints matched file %s' % filename)
         return None
 
+    def from_archive(self, filename):
+        """ Generate (member name, Tree object) for files in an archive """
+        for name, lines in iter_archive(filename):
+            # Keep the first lines as members cannot be read again
+            head = list(itertools.islice(lines, 23))
+            found = self._find_parser(head)
+            if found:
+                tree = self._parse(found, itertools.chain(head, lines))
+                tree.source = '%s/%s' % (filename, name)
+            elif self.raise_no_match:
+                raise ValueError('None of the hints matched file %s in %s'
+                                 % (name, filename))
+            else:
+                tree = None
+            yield name, tree
+
     def from_str(self, string):
         """ Return Tree object from matching parser for given string """
         # Look for hint in first few lines of the string
-        for match in itertools.islice(re.finditer(r'.*', string), 23):
-            for parser, param in self.parsers.items():
-                if param['hint'].search(match.group()):
-                    lines = iter(string.splitlines())
-                    if 'function' in param:
-                        # Apply function to iterable f
-                        tree = parser.parse(param['function'](lines),
-                                            **param['kwargs'])
-                    else:
-                        tree = parser.parse(lines, **param['kwargs'])
-                    return tree
+        found = self._find_parser(_head_lines(string, 23))
+        if found:
+            return self._parse(found, iter(string.splitlines()))
         if self.raise_no_match:
             raise ValueError('None of the hints matched')
         return None
 
+    def _parse(self, found, lines):
+        """ Return Tree object of lines parsed by found dissector """
+        parser, param = found
+        if 'function' in param:
+            # Apply function to iterable lines
+            lines = param['function'](lines)
+        return parser.parse(lines, **param['kwargs'])
+
+    def _find_parser(self, lines):
+        """ Return (dissector, parameters) of the first hint found in lines """
+        parsers = list(self.parsers.items())
+        if self._hints is None:
+            self._hints = _combine_hints([p['hint'] for _, p in parsers])
+        combined, groups = self._hints
+        for line in lines:
+            if combined is None:
+                # Check hints one by one in order of registration
+                for found in parsers:
+                    if found[1]['hint'].search(line):
+                        return found
+                continue
+            m = combined.search(line)
+            if not m:
+                continue
+            # The combined regex finds the leftmost match, so hints that
+            # were registered earlier may still match further on the line
+            index = groups[m.lastindex]
+            for found in parsers[:index]:
+                if found[1]['hint'].search(line):
+                    return found
+            return parsers[index]
+        return None
+
+    def parse_many(self, filenames, workers=None, chunksize=1):
+        """ Generate (filename, Tree or exception) using a process pool """
+        parsers = list(self.parsers)
+        filenames = list(filenames)
+        # Each worker receives a copy of self once and compiles it once
+        pool = concurrent.futures.ProcessPoolExecutor(
+            workers, initializer=_init_worker, initargs=(self,))
+        try:
+            # Send files in chunks to reduce inter process communication
+            futures = {pool.submit(_parse_chunk, filenames[i:i + chunksize]):
+                       filenames[i:i + chunksize]
+                       for i in range(0, len(filenames), chunksize)}
+            for future in concurrent.futures.as_completed(futures):
+                try:
+                    results = future.result()
+                except Exception as e:
+                    # Worker failed, report error for every file of the chunk
+                    results = [(filename, None, e)
+                               for filename in futures[future]]
+                for filename, index, result in results:
+                    if index is not None:
+                        # Reference dissector of this process
+                        result.parser = parsers[index]
+                    yield filename, result
+        finally:
+            pool.shutdown(cancel_futures=True)
+
+
+class MultiDissector(object):
+    """ Parses a document with several dissectors in a single pass """
+
+    def __init__(self, dissectors):
+        """ Initialize self with a sequence of dissector objects """
+        self.dissectors = list(dissectors)
+        if not all(isinstance(d, Dissector) for d in self.dissectors):
+            raise TypeError('Expected dissector objects')
+
+    def parse(self, lines, indent=1, eob=None, eof='end', compact=False):
+        """ Return list of Tree objects, one for each dissector, in order """
+        sinks = [_new_sink(compact) for d in self.dissectors]
+        feeds = [_Cursor(d.context, sink, indent, eob).feed
+                 for d, sink in zip(self.dissectors, sinks)]
+        # Each line is read and stripped once and fed to every dissector
+        for line in _clean_lines(lines, eof):
+            for feed in feeds:
+                feed(line, 0, len(line))
+        trees = []
+        for dissector, sink in zip(self.dissectors, sinks):
+            tree = sink.finish()
+            tree.parser = dissector
+            trees.append(tree)
+        return trees
+
+    def parse_str(self, string, **kwargs):
+        """ Return list of Tree objects that contain the parsed string """
+        return self.parse(iter(string.splitlines()), **kwargs)
+
+    def parse_file(self, filepath, **kwargs):
+        """ Return list of Tree objects that contain the parsed file """
+        with open_file(filepath) as f:
+            return self.parse(f, **kwargs)
+
+
+def _combine_hints(hints):
+    """ Return regex that searches all hints and map of groups to hints """
+    if not hints or not all(_combinable(hint) for hint in hints):
+        return None, None
+    # An empty named group after each hint tells which hint matched
+    pattern = '|'.join('(?:%s)(?P<_hint%d>)' % (hint.pattern, i)
+                       for i, hint in enumerate(hints))
+    try:
+        combined = re.compile(pattern)
+    except re.error:
+        return None, None  # Group names of hints clash
+    return combined, {combined.groupindex['_hint%d' % i]: i
+                      for i in range(len(hints))}
+
+def _combinable(hint):
+    """ Return whether hint keeps its meaning within a combined regex """
+    # Global flags and references to group numbers depend on the position
+    if hint.flags & ~re.UNICODE:
+        return False
+    stack = [sre_parse.parse(hint.pattern)]
+    while stack:
+        for op, av in stack.pop():
+            if op in (sre_parse.GROUPREF, sre_parse.GROUPREF_EXISTS):
+                return False
+            for arg in av if isinstance(av, (tuple, list)) else (av,):
+                if isinstance(arg, sre_parse.SubPattern):
+                    stack.append(arg)
+                elif isinstance(arg, list):
+                    stack.extend(sub for sub in arg
+                                 if isinstance(sub, sre_parse.SubPattern))
+    return True
+
+def _head_lines(string, count):
+    """ Generate first lines of string without splitting all of it """
+    start = 0
+    for _ in range(count):
+        end = string.find('\n', start)
+        if end < 0:
+            yield string[start:]
+            return
+        yield string[start:end]
+        start = end + 1
+
+def open_file(filename, mode='rt', encoding=None):
+    """ Open file and decompress it if its extension is a compression """
+    ext = os.path.splitext(filename)[1].lower()
+    return _openers.get(ext, open)(filename, mode, encoding=encoding)
+
+def iter_archive(filename, encoding=None):
+    """ Generate (member name, lines) of files in a tar or zip file """
+    if zipfile.is_zipfile(filename):
+        with zipfile.ZipFile(filename) as archive:
+            for info in archive.infolist():
+                if not info.is_dir():
+                    with archive.open(info) as member:
+                        yield info.filename, _member_lines(
+                            member, info.filename, encoding)
+        return
+    with open_file(filename, 'rb') as fileobj:
+        # Read as a stream, so members are decompressed only once
+        with tarfile.open(fileobj=fileobj, mode='r|*') as archive:
+            for info in archive:
+                if info.isfile():
+                    with archive.extractfile(info) as member:
+                        yield info.name, _member_lines(
+                            member, info.name, encoding)
+
+def _member_lines(member, name, encoding=None):
+    """ Generate decoded lines of binary archive member """
+    ext = os.path.splitext(name)[1].lower()
+    if ext in _openers:
+        # Decompress member that is a compressed file itself
+        with _openers[ext](member, 'rt', encoding=encoding) as f:
+            yield from f
+        return
+    # Members of a tar stream cannot seek, which io.TextIOWrapper requires
+    yield from codecs.iterdecode(
+        member, encoding or locale.getpreferredencoding(False))
+
+def _open_zst(filename, mode='rb', encoding=None):
+    """ Open zstandard compressed file or file object """
+    if zstandard is None:
+        raise ImportError('zstandard is required to read .zst files')
+    return zstandard.open(filename, mode, encoding=encoding)
+
+# Functions that open compressed files by extension, see open_file
+_openers = {'.gz': gzip.open, '.bz2': bz2.open, '.xz': lzma.open,
+            '.lzma': lzma.open, '.zst': _open_zst, '.tzst': _open_zst}
+
+# AutoDissector used by a worker process of AutoDissector.parse_many
+_worker = None
+
+def _init_worker(auto_dissector):
+    """ Store AutoDissector in worker process """
+    global _worker
+    _worker = auto_dissector
+
+def _parse_chunk(filenames):
+    """ Return (filename, dissector index, Tree or exception) of files """
+    parsers = list(_worker.parsers)
+    results = []
+    for filename in filenames:
+        try:
+            tree = _worker.from_file(filename)
+        except Exception as e:
+            results.append((filename, None, e))
+            continue
+        if tree is None:
+            results.append((filename, None, None))
+            continue
+        # Send index of dissector instead of pickling it with every tree
+        index = parsers.index(tree.parser)
+        tree.parser = None
+        results.append((filename, index, tree))
+    return results
+
+def _split_blocks(lines, indent, eob, eof):
+    """ Return lists of lines of blocks that start without indentation """
+    blocks, closed = [], True
+    for line in lines:
+        line = line.rstrip()
+        if not line.strip():
+            continue
+        if line == eof:
+            break
+        # A line without indentation always returns the parser to level 0,
+        # without indentation only an end of block marker may do so
+        if closed or indent and not line.startswith(' ' * indent):
+            blocks.append([])
+        blocks[-1].append(line)
+        closed = not indent and eob is not None and line.strip() == eob
+    return blocks
+
+def _align_blocks(old, new):
+    """ Return index of the equal old digest or None for each new digest """
+    # Skip common prefix and suffix, which hold all blocks of a single edit
+    head = 0
+    while head < min(len(old), len(new)) and old[head] == new[head]:
+        head += 1
+    tail = 0
+    while (tail < min(len(old), len(new)) - head
+           and old[-1 - tail] == new[-1 - tail]):
+        tail += 1
+    matches = list(range(head)) + [None] * (len(new) - head - tail)
+    matches += range(len(old) - tail, len(old))
+    # Match remaining blocks in order, a block that moved up is new
+    positions = collections.defaultdict(list)
+    for i in range(head, len(old) - tail):
+        positions[old[i]].append(i)
+    low = head
+    for j in range(head, len(new) - tail):
+        found = positions.get(new[j])
+        if found:
+            k = bisect.bisect_left(found, low)
+            if k < len(found):
+                matches[j] = low = found[k]
+                low += 1
+    return matches
 
-def _parse(lines, context, indent=1, eob=None, eof='end'):
+def _copy_value(value, parent, memo):
+    """ Return copy of a value of a previous Tree to add below parent """
+    if not isinstance(value, (dict, list)):
+        return value
+    if id(value) in memo:
+        # Keep branches that are referenced by multiple keys shared
+        return memo[id(value)]
+    if isinstance(value, Tree):
+        copy = memo[id(value)] = Tree(parent)
+        copy.update(value)
+        parent = copy
+    else:
+        # Keep the type, merges extend _Values in place
+        copy = memo[id(value)] = type(value)(value)
+    # Copy nested branches and lists, other values are immutable
+    containers = (dict, list)
+    for k, v in value.items() if isinstance(value, dict) else enumerate(value):
+        if isinstance(v, containers):
+            copy[k] = _copy_value(v, parent, memo)
+    return copy
+
+def _block_units(events):
+    """ Return parts of the Tree that events change and if they are linked """
+    units, linked = {}, False
+    for kind, path, key, value in events:
+        if kind == EXIT:
+            continue
+        if len(path) >= _UNIT_DEPTH:
+            units[path[:_UNIT_DEPTH]] = None
+            if kind == ENTER and key and len(path) == _UNIT_DEPTH:
+                # Additional keys reference the same branch
+                units.update(dict.fromkeys(path[:-1] + (k,) for k in key))
+                linked = True
+        elif kind == ENTER:
+            units[path + (...,)] = None
+            units.update(dict.fromkeys(path + (k,) for k in value))
+            if key:
+                # Branch and its references are rebuilt as a whole
+                units[path] = None
+                units.update(dict.fromkeys(path[:-1] + (k,) for k in key))
+                linked = True
+        elif kind == BRANCH:
+            if path:
+                units[path + (...,)] = None
+        else:
+            units[path + (key,)] = None
+    return tuple(units), linked
+
+def _coarsen(unit, wholes):
+    """ Return the part that is rebuilt as a whole and holds unit, or unit """
+    for i in range(1, len(unit)):
+        if unit[:i] in wholes:
+            return unit[:i]
+    return unit
+
+def _filter_events(event_lists, units, wholes):
+    """ Generate events of given event lists that change given parts """
+    # Blocks above the parts are entered to reach them
+    prefixes = {unit[:i] for unit in units for i in range(len(unit))}
+    for events in event_lists:
+        for event in events:
+            kind, path, key = event[:3]
+            if len(path) >= _UNIT_DEPTH:
+                unit = path[:_UNIT_DEPTH]
+            elif kind == ENTER or kind == EXIT or kind == BRANCH:
+                if path in prefixes or _coarsen(path + (...,),
+                                                wholes) in units:
+                    yield event
+                continue
+            else:
+                unit = path + (key,)
+            if _coarsen(unit, wholes) in units:
+                yield event
+
+def _splice(records, units, branches, tree):
+    """ Return Tree of rebuilt parts in branches and copies of other parts """
+    # Walk down to each part through the branches above rebuilt parts
+    prefixes = {unit[:i] for unit in units for i in range(len(unit))}
+    result, memo = Tree(), {}
+    # Keys appear in the order of the first block that touches them
+    for record in records:
+        for unit in record[1]:
+            if unit[0] in result and unit[:1] not in prefixes:
+                # Branch of top level key is complete
+                continue
+            if unit[-1] is ...:
+                unit = unit[:-1]
+            branch, old, new = result, tree, branches
+            for i, key in enumerate(unit):
+                if unit[:i + 1] in prefixes:
+                    # Rebuilt parts lie below, so walk down
+                    if key not in branch:
+                        branch[key] = Tree(branch)
+                    old = old.get(key) if old is not None else None
+                    branch, new = branch[key], new[key]
+                    continue
+                if key not in branch:
+                    if unit[:i + 1] in units:
+                        value = new[key]
+                        for v in value if isinstance(value, list) else [value]:
+                            if isinstance(v, Tree):
+                                v.parent = branch
+                    else:
+                        value = _copy_value(old[key], branch, memo)
+                    branch[key] = value
+                break
+    return result
+
+def _parse(lines, context, indent=1, eob=None, eof='end', compact=False):
     """ Parse block style document through given nested dict of dissectors """
-    result = Tree()
-    # Push root reference to stack
-    r_stack = [result]
-    c_stack = [context]
-    level = 0
-    while True:
-        # Jump out when the iterator runs out of lines
-        line = next(lines, None)
-        if line is None:
+    sink = _new_sink(compact)
+    feed = _Cursor(context, sink, indent, eob).feed
+    for line in lines:
+        # Skip empty lines and jump out when end of file marker is seen
+        line = line.rstrip()
+        if not line:
+            continue
+        if line == eof:
             break
-        # Also jump out when end of file marker is seen
+        feed(line, 0, len(line))
+    return sink.finish()
+
+def _parse_mapped(buf, context, indent=1, eob=None, eof='end',
+                  compact=False):
+    """ Parse lines of a buffer through the bytes copy of dissectors """
+    sink = _new_sink(compact)
+    feed = _Cursor(context, sink, indent, eob).feed
+    for start, stop in _mapped_lines(buf, eof):
+        feed(buf, start, stop)
+    return sink.finish()
+
+def _dissect(lines, context, indent=1, eob=None, eof='end'):
+    """ Generate events for block style document through given dissectors """
+    sink = _EventSink()
+    cursor = _Cursor(context, sink, indent, eob)
+    events = sink.events
+    for line in _clean_lines(lines, eof):
+        cursor.feed(line, 0, len(line))
+        if events:
+            yield from events
+            events.clear()
+    cursor.close()
+    yield from events
+
+def _dissect_mapped(buf, context, indent=1, eob=None, eof='end'):
+    """ Generate events for lines of a buffer through the bytes dissectors """
+    sink = _EventSink()
+    cursor = _Cursor(context, sink, indent, eob)
+    events = sink.events
+    for start, stop in _mapped_lines(buf, eof):
+        cursor.feed(buf, start, stop)
+        if events:
+            yield from events
+            events.clear()
+    cursor.close()
+    yield from events
+
+def _clean_lines(lines, eof='end'):
+    """ Generate stripped lines that are not empty up to end of file marker """
+    for line in lines:
         line = line.rstrip()
-        if not line.strip():
+        if not line:
             continue
+        # Jump out when end of file marker is seen
         if line == eof:
             break
-        # Pop branch reference of stack if not enough indentation
-        while level and not line.startswith(' ' * indent * level):
+        yield line
+
+def _mapped_lines(buf, eof='end'):
+    """ Generate offsets of the lines of a buffer that _clean_lines yields """
+    eof = eof.encode('utf-8') if eof is not None else eof
+    start, size = 0, len(buf)
+    while start < size:
+        end = buf.find(b'\n', start)
+        if end < 0:
+            end = size
+        # Strip trailing whitespace without copying the line
+        stop = end
+        while stop > start and buf[stop - 1] in b' \t\r\x0b\x0c':
+            stop -= 1
+        if stop > start:
+            # Jump out when end of file marker is seen
+            if (eof is not None and stop - start == len(eof) and
+                    buf.find(eof, start, stop) == start):
+                return
+            yield start, stop
+        start = end + 1
+
+
+class _Cursor(object):
+    """ Position of a dissector in a document that is fed line by line """
+
+    __slots__ = ('p_stack', 'c_stack', 'level', 'indent', 'eob', 'sink',
+                 'pad', 'decode', 'starts', 'marker')
+
+    def __init__(self, context, sink, indent=1, eob=None):
+        """ Initialize self at the root of the document """
+        # Push root position of the sink, a path or a branch, to stack
+        self.p_stack = [sink.root]
+        self.c_stack = [context]
+        self.level = 0
+        self.indent = indent
+        self.sink = sink
+        # Lines are str or bytes, as the patterns of the dissector
+        space = context.space
+        self.pad = space * indent
+        self.decode = isinstance(space, bytes)
+        # Memory maps have no startswith method
+        self.starts = _starts_at if self.decode else str.startswith
+        # Lines are compared with the end of block marker without copying
+        # them, which only a marker without surrounding whitespace can equal
+        self.eob = self.marker = None
+        if eob and eob == eob.strip():
+            self.marker = eob.encode('utf-8') if self.decode else eob
+            self.eob = re.compile(br'\s*%s\s*\Z' % re.escape(self.marker)
+                                  if self.decode else
+                                  r'\s*%s\s*\Z' % re.escape(eob)).match
+
+    def feed(self, buf, start, stop):
+        """ Pass matches of a stripped line in buf to the sink """
+        p_stack, c_stack, sink = self.p_stack, self.c_stack, self.sink
+        level, indent, pad = self.level, self.indent, self.pad
+        starts = self.starts
+        # Pop branch position of stack if not enough indentation
+        while level and not starts(buf, pad * level, start):
             level -= 1
             c_stack.pop()
-            r_stack.pop()
+            sink.exit(p_stack.pop())
         # Pop stack when end of block marker is seen
-        if eob and level and line.strip() == eob:
+        if (self.eob and level and buf.find(self.marker, start, stop) >= 0
+                and self.eob(buf, start, stop)):
             level -= 1
             c_stack.pop()
-            r_stack.pop()
-        # Last item on stack is the current dissector, which should be a list
-        if not isinstance(c_stack[-1], list):
-            c_stack[-1] = [c_stack[-1]]
-        # Iterate over list of dissectors
-        for item in c_stack[-1]:
-            if 'match' in item:
-                m = item['prog'].match(line[indent * level:])
+            sink.exit(p_stack.pop())
+        # Last item on stack is the current dissector, which is a _Block
+        block = c_stack[-1]
+        prefixes = block.prefixes
+        # Text of the line starts after the indentation of the block level
+        text = start + indent * level
+        # Only visit items that can match according to the dispatch index
+        order = block.select(buf, text, stop)
+        n = 0
+        while n < len(order):
+            pos = order[n]
+            n += 1
+            item = block[pos]
+            prefix = prefixes[pos]
+            if prefix and not starts(buf, prefix, text):
+                continue
+            prog = item['prog']
+            if item['sliced'] and text:
+                # Anchors and lookbehinds must not see what precedes text
+                m = (prog.match if 'match' in item
+                     else prog.search)(buf[text:stop])
+            elif 'match' in item:
+                m = prog.match(buf, text, stop)
             else:
-                m = item['prog'].search(line[indent * level:])
+                m = prog.search(buf, text, stop)
             # Skip if regular expression does not match
             if not m:
                 continue
-            # Apply specified action to found named capturing group values
-            named_groups = {k: _action(item.get('actionall'), v)
-                            for k, v in m.groupdict().items() if v is not None}
-            if 'parent' in item:
-                # Insert specified parent Tree object and retain reference
-                p_result = r_stack[-1][item['parent']]
-            else:
-                p_result = r_stack[-1]
-            if 'key' in item:
-                # Use specified unnamed group as root in nested dict
-                tree = named_groups
-                for idx in range(m.re.groups, 0, -1):
-                    if idx in m.re.groupindex.values() or idx == item['key']:
-                        continue
-                    key = _action(item.get('actionall'), m.group(idx))
-                    key = [key] if not isinstance(key, list) else key
-                    # Last unnamed group as value and others as nested dict
-                    tree = {k: tree for k in key} if tree else key[0]
-                # Apply specified action to root and add to Tree
-                key = _action(item.get('action'), m.group(item['key']))
-                for k in [key] if not isinstance(key, list) else key:
-                    if isinstance(tree, dict):
-                        p_result[k].merge_retain(tree)
-                    else:
-                        # Add single value to Tree
-                        if k in p_result and isinstance(p_result[k], Tree):
-                            p_result[k].merge_retain({tree: {}})
-                        else:
-                            p_result.merge_retain({k: tree})
-                continue
-            # Use whole match as key if no groups match
-            key = m.group(0) if not m.lastindex else None
-            if m.re.groups > len(m.re.groupindex):
-                # An unnamed group exists, use first unnamed group as key
-                key = m.group(next(x for x in itertools.count(1)
-                                   if x not in m.re.groupindex.values()))
-            if 'child' in item:
-                # Override key by name if specified and apply group action
-                key = _action(item.get('action'), item.get('name', key))
-                key = [key] if not isinstance(key, list) else key
-                # Push branch reference to stack
-                r_stack.append(p_result[key[0]])
+            if self.decode:
+                m = _DecodedMatch(m)
+            entered = _add_match(item, m, p_stack[-1], sink)
+            if entered is not None:
+                # Push branch position of entered block to stack
+                p_stack.append(entered)
                 c_stack.append(item['child'])
                 level += 1
+                # Remaining items see the deeper indented text, so the
+                # dispatch index no longer applies
+                text = start + indent * level
+                order = range(pos + 1, len(block))
+                n = 0
+        self.level = level
+
+    def close(self):
+        """ Close all open blocks """
+        while self.p_stack[1:]:
+            self.sink.exit(self.p_stack.pop())
+        self.c_stack[1:] = []
+        self.level = 0
+
+
+def _dissect_file(filepath, context, use_mmap=False, **kwargs):
+    """ Generate events for file contents through given dissectors """
+    buf = _map_file(filepath, context) if use_mmap else None
+    if buf is None:
+        with open_file(filepath) as f:
+            yield from _dissect(f, context, **kwargs)
+        return
+    with buf:
+        yield from _dissect_mapped(buf, context.binary, **kwargs)
+
+def _starts_at(buf, prefix, pos):
+    """ Return whether buf starts with prefix at pos, as str.startswith """
+    return buf.find(prefix, pos, pos + len(prefix)) == pos
+
+def _map_file(filepath, context):
+    """ Return memory map of file to parse as bytes or None to read text """
+    if (context.binary is None or
+            os.path.splitext(filepath)[1].lower() in _openers):
+        return None
+    # Text mode decodes with the preferred encoding, which must agree
+    try:
+        ascii = bytes(range(128))
+        if (ascii.decode(locale.getpreferredencoding(False)) !=
+                ascii.decode('ascii')):
+            return None
+    except (LookupError, UnicodeDecodeError):
+        return None
+    with open(filepath, 'rb') as f:
+        # Empty files cannot be mapped
+        if not os.fstat(f.fileno()).st_size:
+            return None
+        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if not _plain_ascii(buf):
+        buf.close()
+        return None
+    return buf
+
+def _plain_ascii(buf):
+    """ Return whether bytes regexes match buf like str regexes its text """
+    for pos in range(0, len(buf), _CHUNK_SIZE):
+        chunk = buf[pos:pos + _CHUNK_SIZE]
+        # Text mode also strips these separators from lines
+        if not chunk.isascii() or any(c in chunk for c in b'\x1c\x1d\x1e\x1f'):
+            return False
+    # Text mode also ends lines at a carriage return that precedes no newline
+    return buf.find(b'\r') < 0 or not _LONE_CR.search(buf)
+
+
+class _DecodedMatch(object):
+    """ Match object of a bytes regex that decodes captured groups """
+
+    __slots__ = 'match', 're', 'lastindex'
+
+    def __init__(self, match):
+        """ Initialize self """
+        self.match = match
+        self.re = match.re
+        self.lastindex = match.lastindex
+
+    def group(self, index):
+        """ Return decoded group of given index """
+        value = self.match.group(index)
+        return value if value is None else value.decode('ascii')
+
+    def groupdict(self):
+        """ Return dict of decoded named groups """
+        return {k: v if v is None else v.decode('ascii')
+                for k, v in self.match.groupdict().items()}
+
+
+def _add_match(item, m, pos, sink):
+    """ Pass match of dissector item to sink and return entered position """
+    # Apply specified action to found named capturing group values
+    named_groups = {k: _action(item['actionall_func'], v)
+                    for k, v in m.groupdict().items() if v is not None}
+    if 'parent' in item:
+        # Insert specified parent branch below current branch
+        pos = sink.child(pos, item['parent'])
+    if 'key' in item:
+        # Use specified unnamed group as root in nested dict
+        tree = named_groups
+        for idx in range(m.re.groups, 0, -1):
+            if idx in m.re.groupindex.values() or idx == item['key']:
+                continue
+            key = _action(item['actionall_func'], m.group(idx))
+            key = [key] if not isinstance(key, list) else key
+            # Last unnamed group as value and others as nested dict
+            tree = {k: tree for k in key} if tree else key[0]
+        # Apply specified action to root and add to Tree
+        key = _action(item['action_func'], m.group(item['key']))
+        key = [key] if not isinstance(key, list) else key
+        for k in key:
+            if isinstance(tree, dict):
+                sink.merge(sink.child(pos, k), tree)
+            else:
+                # Add single value to Tree
+                sink.leaf(pos, k, tree)
+        if not key:
+            sink.touch(pos)
+        return None
+    # Use whole match as key if no groups match
+    key = m.group(0) if not m.lastindex else None
+    if m.re.groups > len(m.re.groupindex):
+        # An unnamed group exists, use first unnamed group as key
+        key = m.group(next(x for x in itertools.count(1)
+                           if x not in m.re.groupindex.values()))
+    if 'child' in item:
+        # Override key by name if specified and apply group action
+        key = _action(item['action_func'], item.get('name', key))
+        key = [key] if not isinstance(key, list) else key
+        # Enter branch using named groups as value and other keys as
+        # references to the first key
+        return sink.enter(pos, key, named_groups)
+    if 'name' in item:
+        # Use 'key' as value or specified value and apply group action
+        value = _action(item['action_func'], item.get('value', key))
+        # Add the unnamed group and named groups
+        named_groups.update({item['name']: value})
+        sink.merge(pos, named_groups)
+    elif 'value' in item:
+        # Apply action to key, use specified value for 'key' add groups
+        key = _action(item['action_func'], key)
+        for k in [key] if not isinstance(key, list) else key:
+            named_groups.update({k: item['value']})
+        sink.merge(pos, named_groups)
+    elif key:
+        # Apply specified action to key and iterate over list of keys
+        key = _action(item['action_func'], key)
+        key = [key] if not isinstance(key, list) else key
+        for k in key:
+            if item.get('grouping') == 'implicit':
+                # Add names groups to Tree as a single value
+                sink.value(pos, k, named_groups)
+            elif item.get('grouping') == 'explicit':
+                # Create list of named groups as value
+                sink.item(pos, k, named_groups)
+            else:
                 # Add to Tree using named groups as value
-                p_result[key[0]].merge_retain(named_groups)
-                # Make references to first stacked key in case of multiple keys
-                for k in key[1:]:
-                    p_result[k] = p_result[key[0]]
-            elif 'name' in item:
-                # Use 'key' as value or specified value and apply group action
-                value = _action(item.get('action'), item.get('value', key))
-                # Add the unnamed group and named groups
-                named_groups.update({item['name']: value})
-                p_result.merge_retain(named_groups)
-            elif 'value' in item:
-                # Apply action to key, use specified value for 'key' add groups
-                key = _action(item.get('action'), key)
-                for k in [key] if not isinstance(key, list) else key:
-                    named_groups.update({k: item['value']})
-                p_result.merge_retain(named_groups)
-            elif key:
-                # Apply specified action to key and iterate over list of keys
-                key = _action(item.get('action'), key)
-                for k in [key] if not isinstance(key, list) else key:
-                    if item.get('grouping') == 'implicit':
-                        # Add names groups to Tree as a single value
-                        p_result.merge_retain({k: named_groups})
-                    elif item.get('grouping') == 'explicit':
-                        # Create list of named groups as value
-                        p_result[k] = p_result.get(k, []) + [named_groups]
-                    else:
-                        # Add to Tree using named groups as value
-                        p_result[k].merge_retain(named_groups)
+                sink.merge(sink.child(pos, k), named_groups)
+        if not key:
+            sink.touch(pos)
+    else:
+        sink.merge(pos, named_groups)
+    return None
+
+def _encode(obj):
+    """ Serialize object to compact JSON string with the fastest encoder """
+    if orjson is None:
+        return _encoder.encode(obj)
+    return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode()
+
+def _has_blocks(value):
+    """ Return whether value is a branch that only holds branches or lists """
+    return bool(value) and isinstance(value, dict) and all(
+        v and isinstance(v, (dict, list)) for v in value.values())
+
+def _iter_blocks(branch, path):
+    """ Generate (path, value) of the blocks of a branch, see Tree.dump """
+    for key, value in branch.items():
+        if _has_blocks(value):
+            yield from _iter_blocks(value, path + (key,))
+        else:
+            yield path + (key,), value
+
+def _write_branch(fp, branch):
+    """ Write branch as compact JSON with its blocks encoded separately """
+    sep = '{'
+    for key, value in branch.items():
+        if _has_blocks(value):
+            # Strip brace and zero to get the key and colon
+            fp.write(sep + _encode({key: 0})[1:-2])
+            _write_branch(fp, value)
+        else:
+            # Strip braces to get the key and value pair
+            fp.write(sep + _encode({key: value})[1:-1])
+        sep = ','
+    fp.write('}' if sep == ',' else '{}')
+
+def build_tree(events, compact=False):
+    """ Return a Tree object that is built from given dissector events """
+    builder = _TreeBuilder(compact)
+    builder.add(events)
+    return builder.finish()
+
+
+class _EventSink(object):
+    """ Receives matches at paths of keys and collects them as events """
+
+    __slots__ = 'events',
+
+    root = ()  # Path of the root branch
+
+    def __init__(self):
+        """ Initialize self with an empty list of events """
+        self.events = []
+
+    def child(self, path, key):
+        """ Return path of the branch of key below path """
+        return path + (key,)
+
+    def enter(self, path, keys, groups):
+        """ Add event that enters block of the first key and return path """
+        path = path + (keys[0],)
+        self.events.append(Event(ENTER, path, tuple(keys[1:]), groups))
+        return path
+
+    def exit(self, path):
+        """ Add event that closes the block at path """
+        self.events.append(Event(EXIT, path, None, None))
+
+    def merge(self, path, groups):
+        """ Add value events that merge groups into branch at path """
+        if not groups:
+            # Nothing to merge, but the branch itself must exist
+            self.events.append(Event(BRANCH, path, None, {}))
+        for k, v in groups.items():
+            self.events.append(Event(VALUE, path, k, v))
+
+    def touch(self, path):
+        """ Add event that only makes sure the branch at path exists """
+        self.events.append(Event(BRANCH, path, None, None))
+
+    def value(self, path, key, value):
+        """ Add event that merges value of key into branch at path """
+        self.events.append(Event(VALUE, path, key, value))
+
+    def item(self, path, key, value):
+        """ Add event that appends value to list of key """
+        self.events.append(Event(ITEM, path, key, value))
+
+    def leaf(self, path, key, value):
+        """ Add event that adds value as leaf to key """
+        self.events.append(Event(LEAF, path, key, value))
+
+
+class _TreeSink(object):
+    """ Receives matches at branches and adds them to a Tree directly """
+
+    __slots__ = 'root',
+
+    def __init__(self):
+        """ Initialize self with an empty Tree """
+        self.root = Tree()
+
+    def child(self, branch, key):
+        """ Return branch of key below branch """
+        return branch[key]
+
+    def enter(self, branch, keys, groups):
+        """ Add named groups to branch of the first key and return it """
+        child = branch[keys[0]]
+        child.merge_retain(groups)
+        # Make references to first key in case of multiple keys
+        for k in keys[1:]:
+            branch[k] = child
+        return child
+
+    def exit(self, branch):
+        """ Nothing to do as the branch is complete """
+
+    def merge(self, branch, groups):
+        """ Merge groups into branch """
+        branch.merge_retain(groups)
+
+    def touch(self, branch):
+        """ Nothing to do as the branch was created when it was looked up """
+
+    def value(self, branch, key, value):
+        """ Merge value of key into branch """
+        branch.merge_value(key, value)
+
+    def item(self, branch, key, value):
+        """ Append value to list of key """
+        items = branch.get(key)
+        if type(items) is _Values:
+            items.append(value)
+        else:
+            branch[key] = _Values(branch.get(key, []) + [value])
+
+    def leaf(self, branch, key, value):
+        """ Add value as leaf to key """
+        if key in branch and isinstance(branch[key], Tree):
+            # Add single value as key to existing branch
+            branch[key].merge_value(value, {})
+        else:
+            branch.merge_value(key, value)
+
+    def finish(self):
+        """ Return the Tree """
+        return self.root
+
+
+class _CompactSink(object):
+    """ Receives matches at branches and adds them to plain dicts directly """
+
+    __slots__ = 'root', 'branches', 'lists', 'kept', 'strings'
+
+    def __init__(self):
+        """ Initialize self with an empty Tree """
+        self.root = Tree()
+        # Ids of the branches and lists of values that the Tree owns, which
+        # tells them apart from dicts and lists that are values
+        self.branches = {id(self.root)}
+        self.lists = set()
+        self.kept = []  # Owned objects that were replaced, so ids stay unique
+        self.strings = {}  # Shared instance of each key and string value
+
+    def _share(self, value):
+        """ Return value with its strings replaced by shared instances """
+        kind = type(value)
+        if kind is str:
+            return self.strings.setdefault(value, value)
+        if kind is dict:
+            return {self._share(k): self._share(v) for k, v in value.items()}
+        if kind is list:
+            # Avoid a call per item for the words and numbers of long lists
+            strings = self.strings
+            return [strings.setdefault(v, v) if type(v) is str else
+                    v if type(v) is int else self._share(v) for v in value]
+        return value
+
+    def _branch(self, branch):
+        """ Raise the error a Tree method raises when branch is a value """
+        if id(branch) not in self.branches:
+            raise AttributeError("'%s' object is not a branch"
+                                 % type(branch).__name__)
+
+    def _merge(self, branch, key, value):
+        """ Set value of key or concatenate value if key exists """
+        if key in branch:
+            values = branch[key]
+            if id(values) not in self.lists:
+                # Make list that can be extended in place on further merges
+                values = branch[key] = (
+                    values[:] if isinstance(values, list) else [values])
+                self.lists.add(id(values))
+            if isinstance(value, list):
+                values.extend(self._share(value))
             else:
-                p_result.merge_retain(named_groups)
-    return result
+                values.append(self._share(value))
+        else:
+            branch[self._share(key)] = self._share(value)
+
+    def child(self, branch, key):
+        """ Return branch of key below branch """
+        if key in branch or id(branch) not in self.branches:
+            return branch[key]
+        child = branch[self._share(key)] = {}
+        self.branches.add(id(child))
+        return child
+
+    def enter(self, branch, keys, groups):
+        """ Add named groups to branch of the first key and return it """
+        child = self.child(branch, keys[0])
+        self.merge(child, groups)
+        # Make references to first key in case of multiple keys
+        for k in keys[1:]:
+            old = id(branch.get(k))
+            if old in self.branches or old in self.lists:
+                self.kept.append(branch[k])
+            branch[self._share(k)] = child
+        return child
+
+    def exit(self, branch):
+        """ Nothing to do as the branch is complete """
 
-def _action(method, value):
-    """ Run given method on value """
-    if method is None or value is None:
+    def merge(self, branch, groups):
+        """ Merge groups into branch """
+        self._branch(branch)
+        for k, v in groups.items():
+            self._merge(branch, k, v)
+
+    def touch(self, branch):
+        """ Nothing to do as the branch was created when it was looked up """
+
+    def value(self, branch, key, value):
+        """ Merge value of key into branch """
+        self._branch(branch)
+        self._merge(branch, key, value)
+
+    def item(self, branch, key, value):
+        """ Append value to list of key """
+        items = branch.get(key)
+        if id(items) in self.lists:
+            items.append(self._share(value))
+        else:
+            items = branch[self._share(key)] = (
+                branch.get(key, []) + [self._share(value)])
+            self.lists.add(id(items))
+
+    def leaf(self, branch, key, value):
+        """ Add value as leaf to key """
+        if key in branch and id(branch[key]) in self.branches:
+            # Add single value as key to existing branch
+            self._merge(branch[key], value, {})
+        else:
+            self.value(branch, key, value)
+
+    def finish(self):
+        """ Return the Tree, whose branches are plain dicts """
+        self.branches = self.lists = self.kept = self.strings = None
+        return self.root
+
+
+def _new_sink(compact):
+    """ Return sink that builds a Tree, with plain dict branches if compact """
+    return _CompactSink() if compact else _TreeSink()
+
+
+class _TreeBuilder(object):
+    """ Builds a Tree from events that may arrive in several batches """
+
+    __slots__ = 'sink', 'r_stack', 'd_stack'
+
+    def __init__(self, compact=False):
+        """ Initialize self with an empty Tree """
+        self.sink = _new_sink(compact)
+        # Stack of open branches and the length of their paths
+        self.r_stack = [self.sink.root]
+        self.d_stack = [0]
+
+    def add(self, events):
+        """ Add events to the Tree """
+        sink, r_stack, d_stack = self.sink, self.r_stack, self.d_stack
+        for kind, path, key, value in events:
+            if kind == EXIT:
+                r_stack.pop()
+                d_stack.pop()
+                continue
+            branch = r_stack[-1]
+            if kind == ENTER:
+                # Walk to the branch that holds the new block
+                for k in path[d_stack[-1]:-1]:
+                    branch = sink.child(branch, k)
+                r_stack.append(sink.enter(branch, path[-1:] + key, value))
+                d_stack.append(len(path))
+                continue
+            # Walk from current branch to the branch the event refers to
+            if len(path) > d_stack[-1]:
+                for k in path[d_stack[-1]:]:
+                    branch = sink.child(branch, k)
+            if kind == BRANCH:
+                if value is not None:
+                    sink.merge(branch, value)
+                continue
+            if kind == VALUE:
+                sink.value(branch, key, value)
+            elif kind == ITEM:
+                sink.item(branch, key, value)
+            else:
+                sink.leaf(branch, key, value)
+
+    def finish(self):
+        """ Return the Tree, with plain dict branches if compact """
+        return self.sink.finish()
+
+
+def _action(func, value):
+    """ Run given bound action on value """
+    if func is None or value is None:
         return value
-    if method == 'expand':
-        return _expand(value)
-    if method == 'split':
-        return value.split()
-    if method == 'list':
-        return [value]
-    if method == 'cidr':
-        return _cidr(value)
-    if method == 'cidr_l':
-        return [_cidr(value)]
-    if method == 'expand_f':
-        return _expand_f(value)
-    if method == 'decrypt7':
-        return _decrypt7(value)
-    if method == 'bool':
-        return not value.startswith('no ')
-    if method == 'expand_h':
-        return _expand_h(value)
-    return value
+    return func(value)
+
+def _bind_action(method):
+    """ Return callable for action name or None to leave values as is """
+    return _actions.get(method) if method is not None else None
+
+
+class _Memo(object):
+    """ Bounded LRU memo of a pure action that returns copies of lists """
+
+    __slots__ = 'func', 'cached'
+
+    def __init__(self, func):
+        """ Initialize self """
+        self.func = func
+        self.cached = functools.lru_cache(maxsize=_MEMO_SIZE)(func)
+
+    def __call__(self, value):
+        """ Return cached result, lists may be extended by the caller """
+        result = self.cached(value)
+        return list(result) if isinstance(result, list) else result
+
+    def __reduce__(self):
+        """ Pickle the function only, the memo starts empty """
+        return _Memo, (self.func,)
+
 
 def _expand(string):
     """ Convert number ranges with hyphens and commas into list of numbers """
     result = []
-    for element in re.split(', *', string):
+    for element in _EXPAND_SPLIT(string):
         # Expand 1-2 to [1, 2] or 1/3-4 to [1/3, 1/4] or 1/5-1/6 to [1/5, 1/6]
-        m = re.match(r'([A-Za-z0-9/]*?)(\d+)\s*-\s*\1?(\d+)', element)
+        m = _EXPAND_RANGE(element)
         if m:
             for num in range(int(m.group(2)), int(m.group(3)) + 1):
                 result.append(m.group(1) + str(num))
@@ -362,8 +1846,8 @@ def _expand(string):
 def _expand_f(string):
     """ Convert Foundry-style port ranges into list of ports """
     result = []
-    for port_range in re.findall(r'ethe(?:rnet)? (\S+(?: to )?\S+)', string):
-        m = re.match(r'(\S+\/)(\d+) to \S+\/(\d+)', port_range)
+    for port_range in _EXPAND_F_PORTS(string):
+        m = _EXPAND_F_RANGE(port_range)
         if m:
             for port in range(int(m.group(2)), int(m.group(3)) + 1):
                 result.append(m.group(1) + str(port))
@@ -374,8 +1858,8 @@ def _expand_f(string):
 def _expand_h(string):
     """ Convert Huawei-style port ranges into list of ports """
     result = []
-    for element in re.split('(?<!to) (?!to)', string):
-        m = re.match(r'(\d+) to (\d+)', element)
+    for element in _EXPAND_H_SPLIT(string):
+        m = _EXPAND_H_RANGE(element)
         if m:
             for num in range(int(m.group(1)), int(m.group(2)) + 1):
                 result.append(str(num))
@@ -390,9 +1874,25 @@ def _cidr(string):
     except ValueError:
         return string
 
+def _cidr_l(string):
+    """ Convert string to CIDR format and then to list """
+    return [_actions['cidr'](string)]
+
+def _split(string):
+    """ Split string into list of words """
+    return string.split()
+
+def _list(string):
+    """ Convert string to list """
+    return [string]
+
+def _bool(string):
+    """ Return False if the line starts with 'no' or else True """
+    return not string.startswith('no ')
+
 def _decrypt7(string):
     """ Decrypt cisco type 7 passwords """
-    m = re.search('(^[0-9A-Fa-f]{2})([0-9A-Fa-f]+)', string)
+    m = _DECRYPT7(string)
     if not m:
         return string
     # First 2 digits are the salt index and the rest is the encrypted password
@@ -404,3 +1904,16 @@ def _decrypt7(string):
         cleartext += chr(ord(salt[index]) ^ int(enc_pw[pos:pos + 2], 16))
         index = (index + 1) % 53
     return ''.join(cleartext)
+
+# Actions by name, pure actions that repeat often are memoized
+_actions = {
+    'expand': _Memo(_expand),
+    'split': _split,
+    'list': _list,
+    'cidr': _Memo(_cidr),
+    'cidr_l': _cidr_l,
+    'expand_f': _Memo(_expand_f),
+    'decrypt7': _Memo(_decrypt7),
+    'bool': _bool,
+    'expand_h': _Memo(_expand_h),
+}
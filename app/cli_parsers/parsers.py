@@ -1,14 +1,25 @@
 from pathlib import Path
-from .confparser import Dissector
+from .confparser import Dissector, open_file
+from .tree_cache import TreeCache
 
 
-def parse_fortigate_config(config_file_path: str | Path, dissector_file_path: str | Path) -> dict:
+def parse_fortigate_config(config_file_path: str | Path, dissector_file_path: str | Path,
+                           dissector_cache_dir: str | Path | None = None,
+                           tree_cache: TreeCache | None = None) -> dict:
     """
     Parse a FortiGate style configuration file at the given path using a dissector YAML file.
 
+    The compiled dissector is reused across calls until the dissector file changes. Config files ending
+    with .gz, .bz2, .xz or .zst are decompressed while they are read.
+
     Args:
-        config_file_path (str | Path): Absolute or relative path to the FortiGate config file.
+        config_file_path (str | Path): Absolute or relative path to the FortiGate config file, which may be
+            compressed.
         dissector_file_path (str | Path): Absolute or relative path to the dissector YAML.
+        dissector_cache_dir (str | Path | None): Optional directory to keep the loaded dissector YAML
+            on disk, so new processes skip YAML parsing.
+        tree_cache (TreeCache | None): Optional cache of parsed Trees, so unchanged configs are not
+            parsed again.
 
     Returns:
         Nested dict representing the parsed config.
@@ -16,10 +27,14 @@ def parse_fortigate_config(config_file_path: str | Path, dissector_file_path: st
     config_path = Path(config_file_path).expanduser().resolve()
     dissector_path = Path(dissector_file_path).expanduser().resolve()
 
-    config_text = config_path.read_text(encoding='utf-8')
-
-    dissector = Dissector.from_file(str(dissector_path))
+    dissector = Dissector.from_file_cached(str(dissector_path), cache_dir=dissector_cache_dir)
 
-    tree = dissector.parse_str(config_text, indent=4)
+    if tree_cache is not None:
+        with open_file(config_path, 'rb') as f:
+            tree = tree_cache.parse_bytes(dissector, f.read(), indent=4)
+    else:
+        with open_file(config_path, encoding='utf-8') as f:
+            config_text = f.read()
+        tree = dissector.parse_str(config_text, indent=4)
 
     return dict(tree)
@@ -0,0 +1,121 @@
+import io
+import os
+import zlib
+import pickle
+import hashlib
+from pathlib import Path
+from collections import OrderedDict
+
+from app.utils import find_project_root
+from .confparser import Dissector, Tree, open_file
+
+
+class TreeCache:
+    """
+    Content-addressed disk cache of parsed Trees with size-based LRU eviction.
+
+    Entries are keyed on the hash of the config bytes, the dissector digest and the parse
+    arguments, so unchanged configs parsed with the same dissector are never parsed again.
+    Trees are stored as zlib compressed pickles. Unpickling can run arbitrary code, so cache_dir
+    must only be writable by users trusted to run code in this process.
+
+    A relative cache_dir is relative to the project root, like the Excel cache.
+    """
+
+    def __init__(self, cache_dir: str | Path = ".cache/trees", max_size: int = 512 * 1024 ** 2):
+        cache_dir = Path(cache_dir)
+        if not cache_dir.is_absolute():
+            cache_dir = find_project_root() / cache_dir
+        self.cache_dir = cache_dir
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        # Entry sizes in least recently used order
+        self._entries: OrderedDict[str, int] = OrderedDict()
+        for path in sorted(self.cache_dir.glob("*.tree"), key=lambda p: p.stat().st_mtime_ns):
+            self._entries[path.stem] = path.stat().st_size
+        self._size = sum(self._entries.values())
+        self._evict()
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.tree"
+
+    @staticmethod
+    def key(data: bytes, dissector: Dissector, **kwargs) -> str:
+        """Return cache key for config bytes parsed by dissector with the given parse arguments."""
+        digest = hashlib.sha256(data)
+        digest.update(dissector.digest.encode())
+        digest.update(repr(sorted(kwargs.items())).encode())
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Tree | None:
+        """Return cached Tree for key or None, and count the hit or miss."""
+        path = self._path(key)
+        try:
+            with path.open("rb") as f:
+                tree = pickle.loads(zlib.decompress(f.read()))
+            os.utime(path)  # Mark as recently used for other processes
+        except Exception:
+            # On any load error, ignore cache (acts like "miss")
+            self.misses += 1
+            return None
+        self.hits += 1
+        if key in self._entries:
+            self._entries.move_to_end(key)
+        return tree
+
+    def put(self, key: str, tree: Tree) -> None:
+        """Store Tree under key and evict least recently used entries above max_size."""
+        parser, tree.parser = tree.parser, None  # Dissectors are not stored
+        try:
+            data = zlib.compress(pickle.dumps(tree, pickle.HIGHEST_PROTOCOL), 1)
+        finally:
+            tree.parser = parser
+        path = self._path(key)
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        tmp_path.write_bytes(data)
+        tmp_path.replace(path)
+        self._size += len(data) - self._entries.pop(key, 0)
+        self._entries[key] = len(data)
+        self._evict()
+
+    def _evict(self) -> None:
+        while self._size > self.max_size and len(self._entries) > 1:
+            key, size = self._entries.popitem(last=False)
+            self._size -= size
+            self._path(key).unlink(missing_ok=True)
+
+    def parse_bytes(self, dissector: Dissector, data: bytes, encoding: str = "utf-8", **kwargs) -> Tree:
+        """Return Tree of config bytes from cache, or parse it with dissector and cache it."""
+        key = self.key(data, dissector, **kwargs)
+        tree = self.get(key)
+        if tree is None:
+            tree = dissector.parse_str(data.decode(encoding), **kwargs)
+            self.put(key, tree)
+        tree.parser = dissector
+        return tree
+
+    def parse_file(self, dissector: Dissector, filepath: str | Path, **kwargs) -> Tree:
+        """
+        Return Tree of config file from cache, or parse it like Dissector.parse_file and cache it.
+
+        The file is read once with open_file, so compressed files are keyed on and parsed from
+        their decompressed contents.
+        """
+        kwargs.pop("use_mmap", None)  # The contents are parsed from memory either way
+        with open_file(filepath, "rb") as f:
+            data = f.read()
+        key = self.key(data, dissector, **kwargs)
+        tree = self.get(key)
+        if tree is None:
+            # Decode and split lines like the text mode file that Dissector.parse_file reads
+            with io.TextIOWrapper(io.BytesIO(data)) as lines:
+                tree = dissector.parse(lines, **kwargs)
+            self.put(key, tree)
+        tree.parser = dissector
+        return tree
+
+    def stats(self) -> dict[str, int]:
+        """Return hit and miss counters, number of entries and their total size in bytes."""
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries), "size": self._size}
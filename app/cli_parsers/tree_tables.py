@@ -0,0 +1,98 @@
+from collections.abc import Iterator, Mapping, Sequence
+
+import pandas as pd
+
+
+def flatten_trees(trees: Mapping[str, Mapping], path: str, columns: Sequence[str] | None = None,
+                  source_column: str = "device", key_columns: Sequence[str] | None = None) -> pd.DataFrame:
+    """
+    Flatten the branches at a path of many parsed trees into one tidy DataFrame.
+
+    The path is a dotted list of keys where ``*`` selects every key of a branch, or every item of a list.
+    Each ``*`` becomes a key column, named after the key before it by default. For example
+    ``dhcp_server.scope.*`` gives one row per DHCP scope with a ``scope`` column holding the scope id.
+
+    The selected branches are collected first and turned into columns in one go, instead of
+    building the frame row by row.
+
+    Args:
+        trees (Mapping[str, Mapping]): Parsed trees by source device name, e.g. results of
+            parse_fortigate_config.
+        path (str): Dotted path to the branches that become rows.
+        columns (Sequence[str] | None): Keys of the branches to keep as columns. All keys when None.
+            Missing keys give missing values.
+        source_column (str): Name of the column with the source device, stored as a categorical.
+        key_columns (Sequence[str] | None): Names of the key columns, one for each ``*`` in the path.
+
+    Returns:
+        DataFrame with the source column, the key columns and the value columns.
+
+    Raises:
+        ValueError: If the number of key columns does not match the number of ``*`` in the path, or
+            the source, key and value columns do not have unique names.
+    """
+    segments = path.split(".")
+    if key_columns is None:
+        key_columns = [_key_name(segments, i) for i, segment in enumerate(segments) if segment == "*"]
+    elif len(key_columns) != segments.count("*"):
+        raise ValueError(f"Expected {segments.count('*')} key columns for path '{path}', got {len(key_columns)}")
+
+    sources: list[str] = []
+    keys: list[tuple] = []
+    branches: list[Mapping] = []
+    for source, tree in trees.items():
+        for key, branch in _select(tree, segments, ()):
+            sources.append(source)
+            keys.append(key)
+            # A leaf at the end of the path becomes a single value column
+            branches.append(branch if isinstance(branch, Mapping) else {"value": branch})
+
+    frame = pd.DataFrame(branches, columns=list(columns) if columns is not None else None)
+    names = [source_column, *key_columns]
+    clashes = [name for i, name in enumerate(names) if name in frame.columns or name in names[:i]]
+    if clashes:
+        raise ValueError(f"Columns {clashes} clash with the source, key or value columns of path '{path}', "
+                         f"pass other names with source_column or key_columns")
+    frame.insert(0, source_column, pd.Categorical(sources))
+    for i, name in enumerate(key_columns):
+        frame.insert(i + 1, name, [key[i] for key in keys])
+    return frame
+
+
+def flatten_trees_to_arrow(trees: Mapping[str, Mapping], path: str, **kwargs):
+    """
+    Flatten the branches at a path of many parsed trees into one Arrow table.
+
+    Takes the same arguments as flatten_trees and requires the pyarrow package.
+
+    Returns:
+        pyarrow.Table with the columns of flatten_trees.
+    """
+    import pyarrow as pa
+
+    return pa.Table.from_pandas(flatten_trees(trees, path, **kwargs), preserve_index=False)
+
+
+def _key_name(segments: list[str], index: int) -> str:
+    """Return the key column name for the ``*`` at index, which is the key before it."""
+    if index and segments[index - 1] != "*":
+        return segments[index - 1]
+    return f"key{segments[:index + 1].count('*')}"
+
+
+def _select(node, segments: list[str], key: tuple) -> Iterator[tuple[tuple, object]]:
+    """Yield (keys of the wildcards, branch) for every branch at the path in node."""
+    if not segments:
+        yield key, node
+        return
+    head, rest = segments[0], segments[1:]
+    if head == "*":
+        if isinstance(node, Mapping):
+            for k, child in node.items():
+                yield from _select(child, rest, key + (k,))
+        elif isinstance(node, list):
+            for k, child in enumerate(node):
+                yield from _select(child, rest, key + (k,))
+    # Test membership first, so Trees do not create missing branches
+    elif isinstance(node, Mapping) and head in node:
+        yield from _select(node[head], rest, key)
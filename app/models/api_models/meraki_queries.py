@@ -1,4 +1,5 @@
 import ipaddress
+from collections.abc import Iterable
 from typing import Any
 
 import pandas as pd
@@ -15,6 +16,8 @@ class MerakiQueries:
         self.dashboard = None
         self.use_cache: bool | None = None
         self.cached_data: dict[str, Any] = {}
+        # Static routes of all sites, with the routes or mock data they were built from
+        self._static_routes_by_site: tuple[Any, dict[str, dict[str, dict[str, Any]]]] | None = None
         if auto_load:
             self._load_env()
 
@@ -122,6 +125,8 @@ class MerakiQueries:
                           ) -> dict[str, dict[str, str]]:
         """Get static routes per site, optionally using cached data or mock_data
 
+        Thin lookup of one site in the result of get_static_routes_all.
+
         Args:
             site_name: required argument.
             use_cache (bool): Whether to use cached data if available. Defaults to True.
@@ -130,29 +135,68 @@ class MerakiQueries:
         Returns:
             Dict containing transformed data.
         """
-        result = {}
+        return self.get_static_routes_all(sites=[site_name], use_cache=use_cache, mock_data=mock_data)
+
+    def get_static_routes_all(self, sites: Iterable[str] | None = None, use_cache: bool = True,
+                              mock_data: list[StaticRoute] | None = None) -> dict[str, dict[str, dict[str, Any]]]:
+        """Get static routes of every site, or of the given sites.
+
+        The routes of all sites are transformed once per loaded routes or mock data, so rendering
+        many sites, one call at a time or all at once, does not go over the routes again. Routes
+        fetched from the API with use_cache=False are transformed on every call. Every call returns
+        a copy of the selected sites, which callers may change.
+
+        Args:
+            sites (Iterable[str] | None): Network names to keep. All sites when None.
+            use_cache (bool): Whether to use cached data if available. Defaults to True.
+            mock_data (list[StaticRoute])
+
+        Returns:
+            Dict containing transformed data by network_name and subnet_name, like get_static_routes.
+        """
+        by_site = self._get_static_routes_by_site(use_cache=use_cache, mock_data=mock_data)
+        names = by_site if sites is None else [site for site in dict.fromkeys(sites) if site in by_site]
+        return {site: self._copy_site(by_site[site]) for site in names}
+
+    def _get_static_routes_by_site(self, use_cache: bool, mock_data: list[StaticRoute] | None
+                                   ) -> dict[str, dict[str, dict[str, Any]]]:
+        """Return transformed static routes of all sites, reused while the routes they came from are."""
+        memo = self._static_routes_by_site
+        if mock_data is not None and memo is not None and memo[0] is mock_data:
+            return memo[1]
+        # The cached routes are loaded once, so they are the same object as long as they are reused
         static_routes = self._load_static_routes_df(use_cache=use_cache, mock_data=mock_data)
+        source = mock_data if mock_data is not None else static_routes
+        if memo is not None and memo[0] is source:
+            return memo[1]
+
+        result = {}
+        # One pass over the rows groups them by site
         for row in static_routes.itertuples(index=False):
 
             network_name = getattr(row, "network_name", None)
             subnet_name = getattr(row, "subnet_name", None)
 
-            if site_name != network_name:
-                continue
-
-            if network_name not in result:
-                result[network_name] = {}
-
-            # print(getattr(row, "fixed_ip_assignments", None))
-            # print(self._static_bindings(getattr(row, "fixed_ip_assignments", {}))) 
-            # print((getattr(row, "reserved_ip_ranges", None)))
-            # print(self._subnet_details(getattr(row, "subnet", str)))
-
-            result[network_name][subnet_name] = {
+            result.setdefault(network_name, {})[subnet_name] = {
                 "enabled": getattr(row, "enabled", True),
                 "subnet_details": self._subnet_details(getattr(row, "subnet", "")),
                 "static_bindings": self._static_bindings(getattr(row, "fixed_ip_assignments", {})),
                 "reserved_ip_ranges": self._extract_reserved_ranges(getattr(row, "reserved_ip_ranges", []))
             }
 
+        if mock_data is not None or use_cache:
+            self._static_routes_by_site = (source, result)
         return result
+
+    @staticmethod
+    def _copy_site(subnets: dict[str, dict[str, Any]]) -> dict[str, dict[str, Any]]:
+        """Copy the static routes of one site, down to their bindings and reserved ranges."""
+        return {
+            subnet_name: {
+                **route,
+                "subnet_details": dict(route["subnet_details"]),
+                "static_bindings": [dict(binding) for binding in route["static_bindings"]],
+                "reserved_ip_ranges": [dict(reserved_range) for reserved_range in route["reserved_ip_ranges"]],
+            }
+            for subnet_name, route in subnets.items()
+        }
@@ -1,32 +1,494 @@
+import dataclasses
+import glob
+import ipaddress
+import os
+import types
+import typing
+from collections import OrderedDict
+from collections.abc import Iterable, Mapping, Sequence
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat, starmap
 from pathlib import Path
-from typing import Optional, Dict
+from typing import Any, Optional
+import numpy as np
 import pandas as pd
-from app.utils import load_all_excel_sheets, find_project_root
+from app.utils import find_project_root
+from .excel_cache import ExcelCache
+
+IPV4_PATTERN = r"(?:(?:25[0-5]|2[0-4]\d|1\d\d|[1-9]?\d)\.){3}(?:25[0-5]|2[0-4]\d|1\d\d|[1-9]?\d)"
 
 
 class BaseExcelDataLoader:
     """
     Base class to load Excel sheets into DataFrames and provide access.
+
+    Sheets are read on first access with a read-only streaming reader and kept for reuse. When
+    max_memory is set, the least recently used sheets are dropped once the loaded sheets use more
+    than max_memory bytes, and read again when they are needed.
+
+    Sheets are cached on disk under cache_dir, relative to the project root unless absolute, so
+    unchanged workbooks are not parsed again. Pass cache_dir=None to always read the workbook.
+
+    A glob pattern or a list of workbooks loads them all as one dataset. The workbooks are read
+    in parallel by up to max_workers processes when load() runs, must have the same sheets and
+    columns, and every sheet is concatenated with the workbook name in source_column. Keys such as
+    ids and template names only refer to rows of the same workbook, see get_index(per_source=True).
     """
 
-    def __init__(self, excel_filepath: str | Path, auto_load: bool = True):
-        filepath = Path(excel_filepath)
-        if not filepath.is_absolute():
-            project_root = find_project_root()
-            filepath = project_root / filepath
-        self.excel_filepath = filepath.resolve()
-        self._dfs: Optional[Dict[str, pd.DataFrame]] = None
+    def __init__(self, excel_filepath: str | Path | Sequence[str | Path], auto_load: bool = True,
+                 cache_dir: str | Path | None = ".cache/excel", max_memory: int | None = None,
+                 source_column: str = "source", max_workers: int | None = None):
+        self.excel_filepaths = _resolve_workbooks(excel_filepath)
+        # Several workbooks are given as a glob pattern or a list, even when only one matches
+        self._multiple = not isinstance(excel_filepath, (str, Path)) or glob.has_magic(str(excel_filepath))
+        self.excel_filepath = None if self._multiple else self.excel_filepaths[0]
+        stems = [path.stem for path in self.excel_filepaths]
+        self.sources = stems if len(set(stems)) == len(stems) else [str(path) for path in self.excel_filepaths]
+        self.source_column = source_column
+        self.max_workers = max_workers
+        self.max_memory = max_memory
+        # Loaded sheets by (sheet name, selected columns or None) in least recently used order
+        self._dfs: Optional[OrderedDict[tuple, pd.DataFrame]] = None
+        self._sizes: dict[tuple, int] = {}
+        self._memory = 0
+        # Row positions by key values, by (sheet name, key columns)
+        self._indexes: dict[tuple, dict] = {}
+        self._sheet_names: list[str] = []
+        self._digest: Optional[str] = None
+        self._excel_file: Optional[pd.ExcelFile] = None
+        self._cache: Optional[ExcelCache] = None
+        if cache_dir is not None:
+            cache_dir = Path(cache_dir)
+            if not cache_dir.is_absolute():
+                cache_dir = find_project_root() / cache_dir
+            self._cache = ExcelCache(cache_dir)
         if auto_load:
             self.load()
 
     def load(self) -> None:
-        """Load all sheets into DataFrames."""
-        self._dfs = load_all_excel_sheets(str(self.excel_filepath))
+        """Open the workbook and drop loaded sheets and indexes. Sheets are read on first access."""
+        self.close()
+        self._dfs = OrderedDict()
+        self._sizes = {}
+        self._memory = 0
+        self._indexes = {}
+        if self._multiple:
+            self._load_workbooks()
+            return
+        sheet_names = None
+        if self._cache is not None:
+            self._digest, sheet_names = self._cache.lookup(self.excel_filepath)
+        if sheet_names is None:
+            sheet_names = self._open().sheet_names
+            if self._cache is not None:
+                self._cache.set_sheet_names(self.excel_filepath, self._digest, sheet_names)
+        self._sheet_names = list(sheet_names)
+
+    def _load_workbooks(self) -> None:
+        """Read all sheets of all workbooks, check that the workbooks match and concatenate every sheet."""
+        workbooks = self._read_workbooks(None)
+        sheet_names = list(workbooks[0])
+        problems = []
+        for source, sheets in zip(self.sources[1:], workbooks[1:]):
+            missing = [name for name in sheet_names if name not in sheets]
+            extra = [name for name in sheets if name not in sheet_names]
+            if missing or extra:
+                problems.append(
+                    f"Sheets of {source} do not match {self.sources[0]}: missing {missing}, extra {extra}"
+                )
+        if problems:
+            raise ValueError("\n".join(problems))
+
+        self._sheet_names = sheet_names
+        for name in sheet_names:
+            self._store((name, None), self._concat_sheet(name, [sheets[name] for sheets in workbooks]))
+
+    def _read_workbooks(self, sheet_names: list[str] | None) -> list[dict[str, pd.DataFrame]]:
+        """Read sheets of every workbook, from the disk cache in this process and the rest in a process pool."""
+        results = [None] * len(self.excel_filepaths)
+        if self._cache is not None:
+            results = [_read_cached_workbook(self._cache, path, sheet_names) for path in self.excel_filepaths]
+        misses = [i for i, result in enumerate(results) if result is None]
+        paths = [self.excel_filepaths[i] for i in misses]
+        cache_dir = None if self._cache is None else self._cache.cache_dir
+        workers = min(len(misses), self.max_workers or os.cpu_count() or 1)
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                frames = list(pool.map(_read_workbook, paths, repeat(cache_dir), repeat(sheet_names)))
+        else:
+            frames = [_read_workbook(path, cache_dir, sheet_names) for path in paths]
+        for i, sheets in zip(misses, frames):
+            results[i] = sheets
+        return results
+
+    def _concat_sheet(self, sheet_name: str, frames: list[pd.DataFrame]) -> pd.DataFrame:
+        """Concatenate a sheet of every workbook, with the workbook name in source_column."""
+        columns = list(frames[0].columns)
+        problems = [
+            f"Columns of sheet {sheet_name} in {source} do not match {self.sources[0]}: "
+            f"{list(frame.columns)} != {columns}"
+            for source, frame in zip(self.sources[1:], frames[1:]) if list(frame.columns) != columns
+        ]
+        if problems:
+            raise ValueError("\n".join(problems))
+        frame = pd.concat(frames, ignore_index=True)
+        frame.insert(0, self.source_column, pd.Categorical(
+            np.repeat(self.sources, [len(f) for f in frames]), categories=self.sources
+        ))
+        return frame
+
+    def close(self) -> None:
+        """Close the workbook file, if it was opened to read sheets."""
+        if self._excel_file is not None:
+            self._excel_file.close()
+            self._excel_file = None
+
+    def _open(self) -> pd.ExcelFile:
+        """Return the workbook opened for reading, which only happens on the first sheet read from Excel."""
+        if self._excel_file is None:
+            self._excel_file = pd.ExcelFile(self.excel_filepath)
+        return self._excel_file
+
+    @property
+    def sheet_names(self) -> list[str]:
+        """Names of the sheets of the workbook."""
+        return list(self._sheet_names)
+
+    def get_dataframe_from_sheet(self, sheet_name: str, columns: Sequence[str] | None = None) -> pd.DataFrame:
+        """
+        Get DataFrame for the given sheet name, reading the sheet on first access.
+
+        Args:
+            sheet_name (str): Name of the sheet.
+            columns (Sequence[str] | None): Columns to read. All columns when None.
+
+        Returns:
+            pd.DataFrame: The sheet, or the given columns of it.
 
-    def get_dataframe_from_sheet(self, sheet_name: str) -> pd.DataFrame:
-        """Get loaded DataFrame for the given sheet name."""
+        Raises:
+            ValueError: If data is not loaded, or the sheet or columns are not in the workbook.
+        """
         if self._dfs is None:
             raise ValueError("Data not loaded yet; call load() first.")
-        if sheet_name not in self._dfs:
+        if sheet_name not in self._sheet_names:
             raise ValueError(f"Sheet {sheet_name} not found in loaded data.")
-        return self._dfs[sheet_name]
+
+        # A loaded full sheet also serves every selection of its columns
+        for key in ((sheet_name, None), (sheet_name, None if columns is None else tuple(columns))):
+            if key in self._dfs:
+                self._dfs.move_to_end(key)
+                return self._select_columns(self._dfs[key], sheet_name, columns)
+
+        frame = self._read_sheet(sheet_name, columns)
+        self._store((sheet_name, None if columns is None else tuple(columns)), frame)
+        return frame
+
+    def get_index(self, sheet_name: str, columns: str | Sequence[str], per_source: bool = False) -> dict:
+        """
+        Get hash index of the rows of a sheet by the values of one or more columns, built once per load.
+
+        Indexes hold row positions, so they stay valid when the sheet is dropped from memory and read
+        again. They are dropped when load() runs again.
+
+        Args:
+            sheet_name (str): Name of the sheet.
+            columns (str | Sequence[str]): Key column, or key columns for tuple keys.
+            per_source (bool): With several workbooks, key rows by (workbook, key) so that lookups stay
+                within one workbook. Make such keys with get_sources and source_key.
+
+        Returns:
+            dict: Array of row positions by key, in sheet order. Rows with missing keys are left out.
+
+        Raises:
+            ValueError: If data is not loaded, or the sheet or columns are not in the workbook.
+        """
+        if per_source and self._multiple:
+            columns = [self.source_column] + ([columns] if isinstance(columns, str) else list(columns))
+        key = (sheet_name, columns if isinstance(columns, str) else tuple(columns))
+        index = self._indexes.get(key)
+        if index is None:
+            frame = self.get_dataframe_from_sheet(sheet_name)
+            by = columns if isinstance(columns, str) else list(columns)
+            self._select_columns(frame, sheet_name, [by] if isinstance(by, str) else by)
+            index = self._indexes[key] = frame.groupby(by, sort=False).indices
+        return index
+
+    def get_sources(self, sheet_name: str) -> np.ndarray | None:
+        """
+        Get the workbook name of every row of a sheet, to look up keys found in it with source_key.
+
+        Args:
+            sheet_name (str): Name of the sheet.
+
+        Returns:
+            np.ndarray | None: Workbook names in sheet order, or None when a single workbook is loaded.
+        """
+        if not self._multiple:
+            return None
+        return self.get_dataframe_from_sheet(sheet_name)[self.source_column].to_numpy()
+
+    @staticmethod
+    def source_key(sources: np.ndarray | None, row: int, key: Any) -> Any:
+        """Return the key of an index built with per_source=True for a key found in a row of a sheet."""
+        return key if sources is None else (sources[row], key)
+
+    def hydrate(self, sheet_name: str, model: type, **values: Sequence) -> list:
+        """
+        Build one dataclass instance per row of a sheet, in one pass over its columns.
+
+        Fields are filled from the columns named after them. Missing values and missing columns
+        become the field default, or None for fields without a plain default. Int fields get ints,
+        also when blank cells made pandas read the column as floats.
+
+        Args:
+            sheet_name (str): Name of the sheet.
+            model (type): Dataclass to build.
+            **values (Sequence): Values to use instead of a column, one per row, by field name.
+
+        Returns:
+            list: Instances of model in sheet order.
+
+        Raises:
+            ValueError: If data is not loaded, the sheet is not in the workbook, or a column is
+                missing for a field without default.
+        """
+        frame = self.get_dataframe_from_sheet(sheet_name)
+        hints = typing.get_type_hints(model)
+        columns: list[Sequence[Any]] = []
+        for field in dataclasses.fields(model):
+            default = None if field.default is dataclasses.MISSING else field.default
+            if field.name in values:
+                columns.append(values[field.name])
+            elif field.name in frame.columns:
+                series = frame[field.name]
+                if _field_kind(hints[field.name]) == (int, False) and pd.api.types.is_float_dtype(series):
+                    # Blank cells upcast int columns to float, so convert whole numbers back
+                    if (series.dropna() % 1 == 0).all():
+                        series = series.astype("Int64")
+                if series.hasnans:
+                    series = series.astype(object).where(series.notna(), default)
+                columns.append(series.tolist())
+            elif field.default_factory is not dataclasses.MISSING:
+                columns.append([field.default_factory() for _ in range(len(frame))])
+            elif field.default is not dataclasses.MISSING:
+                columns.append([default] * len(frame))
+            else:
+                raise ValueError(f"Column {field.name} of {model.__name__} not found in sheet {sheet_name}.")
+        return list(starmap(model, zip(*columns)))
+
+    def validate_models(self, models: Iterable[type], rows: Mapping[str, Sequence[int]] | None = None) -> list[str]:
+        """
+        Check the sheets named after dataclass models against the model fields, over whole sheets at once.
+
+        Checks that required columns and values are present, that int, float and bool fields hold such
+        values, that fields with {"format": "ip"} metadata hold IP addresses, and that fields typed as
+        another model, or a list of them, refer to existing keys. The key of a model is its first field.
+        With several workbooks, references must refer to keys of the same workbook.
+
+        Args:
+            models (Iterable[type]): Dataclasses, each stored in the sheet named after it.
+            rows (Mapping[str, Sequence[int]] | None): Row positions to check by sheet name, for sheets
+                where only some rows are used. Every row of the other sheets is checked.
+
+        Returns:
+            list[str]: Every problem found, with the sheet and Excel row. Empty when the data is valid.
+
+        Raises:
+            ValueError: If data is not loaded.
+        """
+        rows = rows or {}
+        problems = []
+        for model in models:
+            problems += self._validate_model(model, rows.get(model.__name__))
+        return problems
+
+    def _validate_model(self, model: type, rows: Sequence[int] | None) -> list[str]:
+        sheet_name = model.__name__
+        if sheet_name not in self._sheet_names:
+            return [f"Sheet {sheet_name} not found."]
+        frame = self.get_dataframe_from_sheet(sheet_name)
+        if rows is not None:
+            # Labels stay the row positions, so problems still name the Excel rows
+            frame = frame.iloc[rows]
+        hints = typing.get_type_hints(model)
+        problems = []
+        for field in dataclasses.fields(model):
+            required = field.default is dataclasses.MISSING and field.default_factory is dataclasses.MISSING
+            if field.name not in frame.columns:
+                if required:
+                    problems.append(f"Sheet {sheet_name}: required column {field.name} not found.")
+                continue
+
+            series = frame[field.name]
+            missing = series.isna()
+            if not pd.api.types.is_numeric_dtype(series):
+                missing |= series.astype(str).str.strip() == ''
+            if required:
+                problems += self._row_problems(sheet_name, series[missing], f"{field.name} is missing")
+            present = series[~missing]
+
+            kind, many = _field_kind(hints[field.name])
+            if dataclasses.is_dataclass(kind):
+                problems += self._reference_problems(sheet_name, field.name, present, kind, many)
+                continue
+            if kind is int:
+                numbers = pd.to_numeric(present, errors='coerce')
+                problems += self._row_problems(sheet_name, present[numbers.isna() | (numbers % 1 != 0)],
+                                               f"{field.name} {{value!r}} is not an integer")
+            elif kind is float:
+                problems += self._row_problems(sheet_name, present[pd.to_numeric(present, errors='coerce').isna()],
+                                               f"{field.name} {{value!r}} is not a number")
+            elif kind is bool:
+                problems += self._row_problems(sheet_name, present[~present.isin([True, False])],
+                                               f"{field.name} {{value!r}} is not a boolean")
+            if field.metadata.get("format") == "ip":
+                problems += self._row_problems(sheet_name, present[~_is_ip_address(present)],
+                                               f"{field.name} {{value!r}} is not a valid IP address")
+        return problems
+
+    def _reference_problems(self, sheet_name: str, field_name: str, values: pd.Series, model: type,
+                            many: bool) -> list[str]:
+        """Return problems for values that are not keys of the sheet of model."""
+        key = dataclasses.fields(model)[0].name
+        try:
+            keys = self.get_index(model.__name__, key, per_source=True)
+        except ValueError as e:
+            return [f"Sheet {sheet_name}: {field_name} refers to {model.__name__}.{key}: {e}"]
+        if many:
+            # Cells hold one member id or a list of them
+            values = values.explode().dropna()
+        if self._multiple:
+            # Keys of other workbooks do not count
+            sources = self.get_dataframe_from_sheet(sheet_name)[self.source_column]
+            found = pd.MultiIndex.from_arrays([sources.loc[values.index], values]).isin(list(keys))
+        else:
+            found = values.isin(list(keys))
+        return self._row_problems(sheet_name, values[~found],
+                                  f"{field_name} {{value!r}} not found in {model.__name__}.{key}")
+
+    def _row_problems(self, sheet_name: str, values: pd.Series, message: str) -> list[str]:
+        """Return one problem per value, with its workbook and Excel row. The message can use {value}."""
+        problems = []
+        for row, value in values.items():
+            location = sheet_name
+            if self._multiple:
+                # Rows of a workbook are contiguous in the concatenated sheet
+                source = self.get_dataframe_from_sheet(sheet_name)[self.source_column].iat[row]
+                row -= self.get_index(sheet_name, self.source_column)[source][0]
+                location = f"{source} {sheet_name}"
+            # Row 1 of the sheet holds the column names
+            problems.append(f"{location} row {row + 2}: {message.format(value=value)}.")
+        return problems
+
+    def _read_sheet(self, sheet_name: str, columns: Sequence[str] | None) -> pd.DataFrame:
+        """Read a sheet from the disk cache, or from the workbook."""
+        if self._multiple:
+            # Sheets dropped from memory are read again from every workbook
+            frames = [sheets[sheet_name] for sheets in self._read_workbooks([sheet_name])]
+            return self._select_columns(self._concat_sheet(sheet_name, frames), sheet_name, columns)
+        if self._cache is None:
+            frame = self._open().parse(sheet_name, usecols=None if columns is None else list(columns))
+            return self._select_columns(frame, sheet_name, columns)
+
+        # The disk cache keeps whole sheets, so every selection of columns is served from it
+        frame = self._cache.get(self._digest, sheet_name)
+        if frame is None:
+            frame = self._open().parse(sheet_name)
+            self._cache.put(self._digest, sheet_name, frame)
+        return self._select_columns(frame, sheet_name, columns)
+
+    @staticmethod
+    def _select_columns(frame: pd.DataFrame, sheet_name: str, columns: Sequence[str] | None) -> pd.DataFrame:
+        if columns is None:
+            return frame
+        missing = [column for column in columns if column not in frame.columns]
+        if missing:
+            raise ValueError(f"Columns {missing} not found in sheet {sheet_name}.")
+        return frame[list(columns)]
+
+    def _store(self, key: tuple, frame: pd.DataFrame) -> None:
+        """Keep a loaded sheet and drop least recently used sheets above max_memory."""
+        size = int(frame.memory_usage(deep=True).sum())
+        self._dfs[key] = frame
+        self._sizes[key] = size
+        self._memory += size
+        while self.max_memory is not None and self._memory > self.max_memory and len(self._dfs) > 1:
+            evicted, _ = self._dfs.popitem(last=False)
+            self._memory -= self._sizes.pop(evicted)
+
+    def memory_usage(self) -> dict[str, int]:
+        """Return number of loaded sheets and their estimated size in bytes."""
+        return {"sheets": len(self._dfs or ()), "size": self._memory}
+
+
+def _field_kind(hint: Any) -> tuple[Any, bool]:
+    """Return the type of a field without Optional, and whether the field is a list of it."""
+    if typing.get_origin(hint) in (typing.Union, types.UnionType):
+        args = [arg for arg in typing.get_args(hint) if arg is not type(None)]
+        hint = args[0] if len(args) == 1 else Any
+    if typing.get_origin(hint) is list:
+        args = typing.get_args(hint)
+        return (args[0] if args else Any), True
+    return hint, False
+
+
+def _is_ip_address(values: pd.Series) -> pd.Series:
+    """Return mask of the values that are IP addresses, matching IPv4 with a regex and the rest one by one."""
+    text = values.astype(str).str.strip()
+    valid = text.str.fullmatch(IPV4_PATTERN).astype(bool)
+    for row, value in text[~valid].items():
+        try:
+            ipaddress.ip_address(value)
+        except ValueError:
+            continue
+        valid[row] = True
+    return valid
+
+
+def _resolve_workbooks(excel_filepath: str | Path | Sequence[str | Path]) -> list[Path]:
+    """Return the workbook paths of a path, glob pattern or list of paths, relative to the project root."""
+    patterns = [excel_filepath] if isinstance(excel_filepath, (str, Path)) else list(excel_filepath)
+    paths = []
+    for pattern in patterns:
+        pattern = Path(pattern)
+        if not pattern.is_absolute():
+            pattern = find_project_root() / pattern
+        if glob.has_magic(str(pattern)):
+            matches = sorted(glob.glob(str(pattern)))
+            if not matches:
+                raise FileNotFoundError(f"No workbooks match {pattern}")
+            paths += [Path(match).resolve() for match in matches]
+        else:
+            paths.append(pattern.resolve())
+    if not paths:
+        raise ValueError("No workbooks given.")
+    return paths
+
+
+def _read_cached_workbook(cache: ExcelCache, filepath: Path,
+                          sheet_names: list[str] | None) -> dict[str, pd.DataFrame] | None:
+    """Return sheets of a workbook when all of them are in the disk cache, or None."""
+    digest, cached_names = cache.lookup(filepath)
+    if cached_names is None:
+        return None
+    sheets = {}
+    for name in sheet_names or cached_names:
+        frame = cache.get(digest, name) if name in cached_names else None
+        if frame is None:
+            return None
+        sheets[name] = frame
+    return sheets
+
+
+def _read_workbook(filepath: Path, cache_dir: Path | None, sheet_names: list[str] | None) -> dict[str, pd.DataFrame]:
+    """Read sheets of a workbook, all of them when sheet_names is None, and cache them. Runs in worker processes."""
+    with pd.ExcelFile(filepath) as excel_file:
+        sheets = {name: excel_file.parse(name) for name in sheet_names or excel_file.sheet_names}
+        all_names = excel_file.sheet_names
+    if cache_dir is not None:
+        cache = ExcelCache(cache_dir)
+        digest, _ = cache.lookup(filepath)
+        cache.set_sheet_names(filepath, digest, all_names)
+        for name, frame in sheets.items():
+            cache.put(digest, name, frame)
+    return sheets
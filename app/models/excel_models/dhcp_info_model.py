@@ -1,25 +1,25 @@
 from __future__ import annotations
 from typing import Optional
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 
 
-@dataclass
+@dataclass(slots=True)
 class DhcpInfo:
     network_name: str
     subnet_name: str
-    gw_ip: str
+    gw_ip: str = field(metadata={"format": "ip"})
     lease_time: int
     ns_template: Optional[NameServerTemplate] = None
     dhcp_option_template: Optional[DhcpOptionTemplate] = None
 
 
-@dataclass
+@dataclass(slots=True)
 class DhcpOptionTemplate:
     template_name: str
     dhcp_options: list[DhcpOption]
 
 
-@dataclass
+@dataclass(slots=True)
 class DhcpOption:
     id: int
     code: str
@@ -27,7 +27,7 @@ class DhcpOption:
     value: str
     
 
-@dataclass
+@dataclass(slots=True)
 class NameServer:
     """
     Represents a single name server entity.
@@ -37,7 +37,7 @@ class NameServer:
     description: str = ""         # Optional description
 
 
-@dataclass
+@dataclass(slots=True)
 class NameServerTemplate:
     """
     Represents a name server template grouping multiple name servers.
@@ -1,146 +1,389 @@
+import dataclasses
+from collections.abc import Callable, Iterable
+
+import numpy as np
 import pandas as pd
-from typing import Any
+from typing import Any, Optional
 
 from .base_excel_data_loader import BaseExcelDataLoader
+from .dhcp_info_model import DhcpInfo, DhcpOption, DhcpOptionTemplate, NameServer, NameServerTemplate
+
+SUBNET_KEY = ['network_name', 'subnet_name']
+# DhcpInfo rows with a blank value in any of these columns are skipped by get_dhcp_info_data_all
+QUERY_COLUMNS = ['network_name', 'subnet_name', 'gw_ip', 'lease_time', 'ns_template', 'dhcp_option_template']
+MODELS = (DhcpInfo, NameServerTemplate, NameServer, DhcpOptionTemplate, DhcpOption)
 
 
 class DhcpInfoQueries(BaseExcelDataLoader):
-  
-    def _get_name_servers_for_subnet(self, network_name: str, subnet_name: str) -> list[str]:
+
+    # Hydrated models and built query results by name, dropped by load()
+    _models: Optional[dict[str, Any]] = None
+
+    def load(self) -> None:
+        """Open the workbook and drop loaded sheets, indexes and hydrated models."""
+        super().load()
+        self._models = {}
+
+    def validate(self) -> list[str]:
+        """
+        Check every DHCP info sheet against the models in dhcp_info_model before any data is used.
+
+        DhcpInfo rows that get_dhcp_info_data_all skips are not checked, see get_skipped_rows.
+
+        Returns:
+            list[str]: Every problem found, with the sheet and Excel row. Empty when the data is valid.
+        """
+        rows = None
+        if 'DhcpInfo' in self._sheet_names:
+            frame = self.get_dataframe_from_sheet('DhcpInfo')
+            # Missing columns are reported by validate_models
+            rows = {'DhcpInfo': _filled_rows(frame, [c for c in QUERY_COLUMNS if c in frame.columns])}
+        return self.validate_models(MODELS, rows)
+
+    def get_skipped_rows(self) -> list[str]:
+        """
+        Get the DhcpInfo rows that get_dhcp_info_data_all skips because a column it needs is blank.
+
+        Returns:
+            list[str]: One warning per skipped row, with the Excel row and its blank columns.
+        """
+        frame = self.get_dataframe_from_sheet('DhcpInfo')
+        columns = [c for c in QUERY_COLUMNS if c in frame.columns]
+        blank = ~_filled_mask(frame, columns)
+        skipped = blank[blank.any(axis=1)]
+        names = pd.Series([', '.join(skipped.columns[row]) for row in skipped.to_numpy()], index=skipped.index)
+        return self._row_problems('DhcpInfo', names, "skipped for blank {value}")
+
+    def _get_template_names(self, subnets: list[tuple], template_column: str) -> list[tuple]:
+        """
+        Get the template name of each subnet from the first DhcpInfo row of that subnet.
+
+        Args:
+            subnets (list[tuple]): Unique (network_name, subnet_name) pairs.
+            template_column (str): DhcpInfo column that holds the template name.
+
+        Returns:
+            list[tuple]: The template name of every subnet, and its key in a template index built
+            with per_source=True.
+        """
+        rows = self.get_index('DhcpInfo', SUBNET_KEY)
+        first_rows = [rows[subnet][0] for subnet in subnets]
+        names = self.get_dataframe_from_sheet('DhcpInfo')[template_column].take(first_rows).tolist()
+        sources = self.get_sources('DhcpInfo')
+        return [(name, self.source_key(sources, row, name)) for row, name in zip(first_rows, names)]
+
+    def _get_member_rows(self, template_rows: np.ndarray, members: np.ndarray, sources: np.ndarray | None,
+                         ids: dict) -> list[int]:
         """
-        Get the list of name server addresses for the given network and subnet.
-        
+        Get the rows of the members of a template, in template order.
+
+        Args:
+            template_rows (np.ndarray): Rows of the template in the template sheet.
+            members (np.ndarray): Template sheet column with the member id, or a list of member ids.
+            sources (np.ndarray | None): Workbook of every template sheet row, see get_sources.
+            ids (dict): Index of the member sheet by id, built with per_source=True.
+
+        Returns:
+            list[int]: Rows of the members in the member sheet.
+        """
+        rows = []
+        for row in template_rows:
+            member = members[row]
+            for member_id in member if pd.api.types.is_list_like(member) else (member,):
+                rows.extend(ids.get(self.source_key(sources, row, member_id), ()))
+        return rows
+
+    def _get_name_servers_by_subnet(self, subnets: list[tuple]) -> tuple[dict[tuple, list[str]], dict[tuple, str]]:
+        """
+        Get the name server addresses of many subnets through the template_name and id indexes.
+
         Args:
-            network_name (str): The name of the network.
-            subnet_name (str): The name of the subnet.
+            subnets (list[tuple]): Unique (network_name, subnet_name) pairs.
 
         Returns:
-            list[str]: List of name server IP addresses.
+            tuple: Name server addresses by (network_name, subnet_name), and an error message by
+            (network_name, subnet_name) for subnets without name servers.
 
         Raises:
             ValueError: If required sheets or columns are missing.
-            LookupError: If no name servers are found for the specified subnet.
         """
         try:
-            dhcp_info_df = self.get_dataframe_from_sheet('DhcpInfo')
             name_server_templates_df = self.get_dataframe_from_sheet('NameServerTemplate')
-            name_servers_df = self.get_dataframe_from_sheet('NameServer') 
+            name_servers_df = self.get_dataframe_from_sheet('NameServer')
+            templates = self.get_index('NameServerTemplate', 'template_name', per_source=True)
+            ids = self.get_index('NameServer', 'id', per_source=True)
         except ValueError as e:
             raise ValueError(f"Missing sheet or required column: {e}")
 
-        filtered_dhcp = dhcp_info_df[
-            (dhcp_info_df['network_name'] == network_name) &
-            (dhcp_info_df['subnet_name'] == subnet_name)
-        ]
-        if filtered_dhcp.empty:
-            raise LookupError(f"No DHCP info found for network '{network_name}', subnet '{subnet_name}'.")
-        ns_template_name = filtered_dhcp.iloc[0]['ns_template']
-        filtered_template = name_server_templates_df[
-            name_server_templates_df['template_name'] == ns_template_name
-        ]        
-        if filtered_template.empty:
-            raise LookupError(f"No name server template found with name '{ns_template_name}'.")
-        joined = pd.merge(
-            filtered_template,
-            name_servers_df,
-            left_on='name_servers',
-            right_on='id',
-            how='inner'
-        )
-        addresses = joined['address'].drop_duplicates().tolist()        
+        members = name_server_templates_df['name_servers'].to_numpy()
+        sources = self.get_sources('NameServerTemplate')
+        errors = {}
+        spans = []
+        name_server_rows = []
+        for subnet, (template, key) in zip(subnets, self._get_template_names(subnets, 'ns_template')):
+            if key not in templates:
+                errors[subnet] = f"No name server template found with name '{template}'."
+                continue
+            rows = self._get_member_rows(templates[key], members, sources, ids)
+            if not rows:
+                errors[subnet] = f"No name server addresses found for template '{template}'."
+                continue
+            spans.append((subnet, len(rows)))
+            name_server_rows += rows
 
-        if not addresses:
-            raise LookupError(f"No name server addresses found for template '{ns_template_name}'.")
+        # Take the addresses of all subnets at once
+        addresses = {}
+        values = iter(name_servers_df['address'].take(name_server_rows).tolist())
+        for subnet, count in spans:
+            addresses[subnet] = list(dict.fromkeys(next(values) for _ in range(count)))
+        return addresses, errors
 
-        return addresses
-    
-    def _get_dhcp_options_for_subnet(self, network_name: str, subnet_name: str) -> list[dict]:
+    def _get_dhcp_options_by_subnet(self, subnets: list[tuple]) -> tuple[dict[tuple, list[dict]], dict[tuple, str]]:
         """
-        Get DHCP options for the given network and subnet.
+        Get the DHCP options of many subnets through the template_name and id indexes.
 
         Args:
-            network_name (str): The name of the network.
-            subnet_name (str): The name of the subnet.
+            subnets (list[tuple]): Unique (network_name, subnet_name) pairs.
 
         Returns:
-            list[dict]: List of DHCP option dictionaries with 'code', 'type', and 'value' keys.
+            tuple: Lists of DHCP option dictionaries with 'code', 'type', and 'value' keys by
+            (network_name, subnet_name), and an error message by (network_name, subnet_name) for
+            subnets without DHCP options.
 
         Raises:
             ValueError: If required sheets or columns are missing.
-            LookupError: If no DHCP options are found for the specified subnet.
         """
         try:
-            dhcp_info_df = self.get_dataframe_from_sheet('DhcpInfo')
             dhcp_options_templates_df = self.get_dataframe_from_sheet('DhcpOptionTemplate')
             dhcp_options_df = self.get_dataframe_from_sheet('DhcpOption')
+            templates = self.get_index('DhcpOptionTemplate', 'template_name', per_source=True)
+            ids = self.get_index('DhcpOption', 'id', per_source=True)
         except ValueError as e:
             raise ValueError(f"Missing sheet or required column: {e}")
 
-        filtered_dhcp = dhcp_info_df[
-            (dhcp_info_df['network_name'] == network_name) &
-            (dhcp_info_df['subnet_name'] == subnet_name)
-        ]
-
-        if filtered_dhcp.empty:
-            raise LookupError(f"No DHCP info found for network '{network_name}', subnet '{subnet_name}'.")
-        dhcp_options_template_name = filtered_dhcp.iloc[0]['dhcp_option_template']
-
-        filtered_template = dhcp_options_templates_df[
-            dhcp_options_templates_df['template_name'] == dhcp_options_template_name
-        ]        
-
-        if filtered_template.empty:
-            raise LookupError(f"No DHCP options template found with name '{dhcp_options_template_name}'.")
-        exploded_template = filtered_template.explode('dhcp_options')
-
-        joined = pd.merge(
-            exploded_template,
-            dhcp_options_df,
-            left_on='dhcp_options',
-            right_on='id',
-            how='inner'
-        )
-        options_df = joined[['code', 'type', 'value']].drop_duplicates()        
-        results = options_df.to_dict(orient='records')
-        
-        if not results:
-            raise LookupError(f"No DHCP options found for template '{dhcp_options_template_name}'.")
-
-        return results
-    
+        members = dhcp_options_templates_df['dhcp_options'].to_numpy()
+        sources = self.get_sources('DhcpOptionTemplate')
+        errors = {}
+        spans = []
+        option_rows = []
+        for subnet, (template, key) in zip(subnets, self._get_template_names(subnets, 'dhcp_option_template')):
+            if key not in templates:
+                errors[subnet] = f"No DHCP options template found with name '{template}'."
+                continue
+            rows = self._get_member_rows(templates[key], members, sources, ids)
+            if not rows:
+                errors[subnet] = f"No DHCP options found for template '{template}'."
+                continue
+            spans.append((subnet, len(rows)))
+            option_rows += rows
+
+        # Take the options of all subnets at once
+        options = {}
+        records = iter(dhcp_options_df[['code', 'type', 'value']].take(option_rows).to_dict(orient='records'))
+        for subnet, count in spans:
+            unique = {}
+            for record in (next(records) for _ in range(count)):
+                unique.setdefault(tuple(record.values()), record)
+            options[subnet] = list(unique.values())
+        return options, errors
+
     def get_dhcp_info_data(self, site_name: str) -> dict[dict[str, str], str | Any]:
 
         """
+        Thin lookup of one site in the result of get_dhcp_info_data_all.
+
         :param site_name: required argument
         :return: dict with transformed data
+        :raises LookupError: If subnets have no name servers or DHCP options, listing every such subnet
+        """
+
+        return self.get_dhcp_info_data_all(sites=[site_name])
+
+    def get_dhcp_info_data_all(self, sites: Iterable[str] | None = None) -> dict[str, dict[str, dict[str, Any]]]:
+        """
+        Get the DHCP info of every site, or of the given sites.
+
+        The DHCP info of all sites is built once per load in one pass over the sheets, so rendering
+        many sites, one call at a time or all at once, does not scan the sheets again. Every call
+        returns a copy of the selected sites, which callers may change.
+
+        Args:
+            sites (Iterable[str] | None): Network names to keep. All sites when None.
+
+        Returns:
+            dict: DHCP info by network_name and subnet_name, like get_dhcp_info_data.
+
+        Raises:
+            LookupError: If subnets of the selected sites have no name servers or DHCP options, listing
+                every such subnet.
+        """
+        by_site, errors_by_site = self._get_models('dhcp_info_data', self._build_dhcp_info_data)
+        if sites is None:
+            names, errors = list(by_site), [error for site_errors in errors_by_site.values() for error in site_errors]
+        else:
+            sites = list(dict.fromkeys(sites))
+            names = [site for site in sites if site in by_site]
+            errors = [error for site in sites for error in errors_by_site.get(site, ())]
+        if errors:
+            raise LookupError("\n".join(errors))
+        return {site: self._copy_site(by_site[site]) for site in names}
+
+    @staticmethod
+    def _copy_site(subnets: dict[str, dict[str, Any]]) -> dict[str, dict[str, Any]]:
+        """Copy the DHCP info of one site, down to its name server lists and DHCP options."""
+        return {
+            subnet_name: {
+                **info,
+                "name_servers": list(info["name_servers"]),
+                "dhcp_options": [dict(option) for option in info["dhcp_options"]],
+            }
+            for subnet_name, info in subnets.items()
+        }
+
+    def _build_dhcp_info_data(self) -> tuple[dict[str, dict[str, dict[str, Any]]], dict[str, list[str]]]:
         """
+        Build the DHCP info of every site in one pass over the sheets.
 
+        Rows are looked up through the sheet indexes of get_index. Rows with a blank value in one of
+        QUERY_COLUMNS are skipped, and subnets without name servers or DHCP options are left out with an error.
+
+        Returns:
+            tuple: DHCP info by network_name and subnet_name, and the error messages of the subnets
+            left out by network_name.
+        """
         result = {}
-        
+        errors_by_site = {}
+
         dhcp_info_df = self.get_dataframe_from_sheet('DhcpInfo')
-        required_columns = ['network_name', 'subnet_name', 'gw_ip', 'lease_time', 'ns_template', 'dhcp_option_template']
+        filtered_df = dhcp_info_df.take(_filled_rows(dhcp_info_df, QUERY_COLUMNS))
+
+        if filtered_df.empty:
+            return result, errors_by_site
 
-        # Filter rows where all these columns are non-null and non-empty
-        filtered_df = dhcp_info_df.dropna(subset=required_columns)
+        subnets = list(dict.fromkeys(zip(filtered_df['network_name'], filtered_df['subnet_name'])))
+        name_servers, name_server_errors = self._get_name_servers_by_subnet(subnets)
+        dhcp_options, dhcp_option_errors = self._get_dhcp_options_by_subnet(subnets)
 
-        # Optionally, filter out empty strings for string columns
-        filtered_df = filtered_df[(filtered_df[required_columns].astype(str) != '').all(axis=1)]
+        for key in subnets:
+            errors = [e[key] for e in (name_server_errors, dhcp_option_errors) if key in e]
+            if errors:
+                errors_by_site.setdefault(key[0], []).extend(errors)
 
+        # One pass over the rows groups them by site
         for row in filtered_df.itertuples(index=False):
 
             network_name = getattr(row, 'network_name', '')
             subnet_name = getattr(row, 'subnet_name', '')
-
-            if network_name != site_name:
+            if (network_name, subnet_name) in name_server_errors or (network_name, subnet_name) in dhcp_option_errors:
                 continue
 
-            if network_name not in result:
-                result[network_name] = {}
-            
-            result[network_name][subnet_name] = {
+            result.setdefault(network_name, {})[subnet_name] = {
                 "gw_ip": getattr(row, "gw_ip", None),
                 "lease_time": getattr(row, "lease_time", None),
-                "name_servers": self._get_name_servers_for_subnet(network_name, subnet_name),
-                "dhcp_options": self._get_dhcp_options_for_subnet(network_name, subnet_name),
+                "name_servers": name_servers[(network_name, subnet_name)],
+                "dhcp_options": dhcp_options[(network_name, subnet_name)],
             }
-        return result
+        return result, errors_by_site
+
+    def _hydrate_templates(self, sheet_name: str, model: type, members: list, member_sheet: str) -> dict:
+        """
+        Build the templates of a template sheet, with their members resolved by id.
+
+        Args:
+            sheet_name (str): Template sheet with one member id, or a list of member ids, per row.
+            model (type): Template dataclass, with the template name and member list fields.
+            members (list): Hydrated rows of the member sheet, shared by all templates.
+            member_sheet (str): Name of the member sheet.
+
+        Returns:
+            dict: Templates by template name, or by (workbook, template name) when several workbooks
+            are loaded, in sheet order. Unknown member ids are left out.
+        """
+        name_field, members_field = (field.name for field in dataclasses.fields(model))
+        frame = self.get_dataframe_from_sheet(sheet_name)
+        ids = self.get_index(member_sheet, 'id', per_source=True)
+        sources = self.get_sources(sheet_name)
+        templates = {}
+        for row, (name, member) in enumerate(zip(frame[name_field].tolist(), frame[members_field].tolist())):
+            if pd.isna(name):
+                continue
+            key = self.source_key(sources, row, name)
+            template = templates.get(key)
+            if template is None:
+                template = templates[key] = model(name, [])
+            template_members = getattr(template, members_field)
+            for member_id in member if pd.api.types.is_list_like(member) else (member,):
+                template_members.extend(
+                    members[member_row] for member_row in ids.get(self.source_key(sources, row, member_id), ())
+                )
+        return templates
+
+    def _get_models(self, name: str, build: Callable[[], Any]) -> Any:
+        """Return hydrated models by name, built once per load."""
+        if self._models is None:
+            # Not loaded yet, so building raises the error of get_dataframe_from_sheet
+            return build()
+        if name not in self._models:
+            self._models[name] = build()
+        return self._models[name]
+
+    def get_name_server_templates(self) -> dict[Any, NameServerTemplate]:
+        """
+        Get all name server templates, with their name servers resolved into shared NameServer objects.
+
+        Returns:
+            dict[Any, NameServerTemplate]: Templates by template name, or by (workbook, template name)
+            when several workbooks are loaded, built once per load.
+        """
+        return self._get_models('name_server_templates', lambda: self._hydrate_templates(
+            'NameServerTemplate', NameServerTemplate, self.hydrate('NameServer', NameServer), 'NameServer'
+        ))
+
+    def get_dhcp_option_templates(self) -> dict[Any, DhcpOptionTemplate]:
+        """
+        Get all DHCP option templates, with their options resolved into shared DhcpOption objects.
+
+        Returns:
+            dict[Any, DhcpOptionTemplate]: Templates by template name, or by (workbook, template name)
+            when several workbooks are loaded, built once per load.
+        """
+        return self._get_models('dhcp_option_templates', lambda: self._hydrate_templates(
+            'DhcpOptionTemplate', DhcpOptionTemplate, self.hydrate('DhcpOption', DhcpOption), 'DhcpOption'
+        ))
+
+    def get_dhcp_infos(self) -> list[DhcpInfo]:
+        """
+        Get all DhcpInfo rows as DhcpInfo objects that share their resolved templates.
+
+        Returns:
+            list[DhcpInfo]: One object per DhcpInfo row in sheet order, built once per load. Unknown
+            templates are None.
+        """
+        return self._get_models('dhcp_infos', self._hydrate_dhcp_infos)
+
+    def _hydrate_dhcp_infos(self) -> list[DhcpInfo]:
+        dhcp_info_df = self.get_dataframe_from_sheet('DhcpInfo')
+        name_server_templates = self.get_name_server_templates()
+        dhcp_option_templates = self.get_dhcp_option_templates()
+        sources = self.get_sources('DhcpInfo')
+        return self.hydrate(
+            'DhcpInfo', DhcpInfo,
+            ns_template=[
+                name_server_templates.get(self.source_key(sources, row, name))
+                for row, name in enumerate(dhcp_info_df['ns_template'].tolist())
+            ],
+            dhcp_option_template=[
+                dhcp_option_templates.get(self.source_key(sources, row, name))
+                for row, name in enumerate(dhcp_info_df['dhcp_option_template'].tolist())
+            ],
+        )
+
+
+def _filled_mask(frame: pd.DataFrame, columns: list[str]) -> pd.DataFrame:
+    """Return mask of the cells of the columns that are non-null and non-empty."""
+    return frame[columns].notna() & (frame[columns].astype(str) != '')
+
+
+def _filled_rows(frame: pd.DataFrame, columns: list[str]) -> np.ndarray:
+    """Return positions of the rows where all columns are non-null and non-empty."""
+    return np.flatnonzero(_filled_mask(frame, columns).all(axis=1).to_numpy())
@@ -0,0 +1,165 @@
+import os
+import json
+import mmap
+import pickle
+import struct
+import hashlib
+from pathlib import Path
+
+import pandas as pd
+
+# Sheet file layout: header, buffer table, pickle data, then the out-of-band buffers
+_HEADER = struct.Struct("<QQ")  # pickle length, number of buffers
+_BUFFER = struct.Struct("<QQ")  # offset, length
+_ALIGN = 64
+
+
+class ExcelCache:
+    """
+    Disk cache of the sheets of Excel workbooks, so unchanged workbooks are not parsed again.
+
+    Every sheet is stored in its own file, keyed on the SHA-256 of the workbook content and the
+    sheet name, so sheets can be cached and loaded one at a time. An index file per workbook path
+    remembers the mtime, size, content hash and sheet names of the workbook, so the content is only
+    hashed again when the mtime or size changed.
+
+    Sheets are pickled with protocol 5 and their column buffers stored out of band. On a hit the
+    sheet file is memory mapped copy-on-write and the columns are built on top of the mapping,
+    so DataFrames and their dtypes come back exactly as read_excel returned them.
+
+    Unpickling can run arbitrary code, so cache_dir must only be writable by users trusted to run
+    code in this process. Do not point it at a shared or downloaded directory.
+    """
+
+    def __init__(self, cache_dir: str | Path = ".cache/excel"):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+
+    def _index_path(self, filepath: Path) -> Path:
+        return self.cache_dir / f"{hashlib.sha256(str(filepath).encode()).hexdigest()}.json"
+
+    def _sheet_path(self, digest: str, sheet_name: str) -> Path:
+        return self.cache_dir / f"{digest}-{hashlib.sha256(sheet_name.encode()).hexdigest()[:16]}.sheet"
+
+    @staticmethod
+    def file_digest(filepath: str | Path) -> str:
+        """Return SHA-256 hex digest of the file content."""
+        digest = hashlib.sha256()
+        with open(filepath, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 ** 2), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def lookup(self, filepath: str | Path) -> tuple[str, list[str] | None]:
+        """Return content digest of the workbook and its sheet names, or None when not known yet."""
+        filepath = Path(filepath).resolve()
+        stat = filepath.stat()
+        index = self._read_index(filepath)
+        if index is not None and (index["mtime_ns"], index["size"]) == (stat.st_mtime_ns, stat.st_size):
+            return index["sha256"], index["sheets"]
+
+        digest = self.file_digest(filepath)
+        sheets = None
+        if index is not None:
+            if index["sha256"] == digest:
+                sheets = index["sheets"]
+            else:
+                self._remove_sheets(index["sha256"])
+        self._write_index(filepath, stat.st_mtime_ns, stat.st_size, digest, sheets)
+        return digest, sheets
+
+    def set_sheet_names(self, filepath: str | Path, digest: str, sheets: list[str]) -> None:
+        """Remember the sheet names of the workbook with the given content digest."""
+        filepath = Path(filepath).resolve()
+        index = self._read_index(filepath)
+        if index is not None and index["sha256"] == digest:
+            self._write_index(filepath, index["mtime_ns"], index["size"], digest, list(sheets))
+
+    def get(self, digest: str, sheet_name: str) -> pd.DataFrame | None:
+        """Return cached sheet of the workbook with the given content digest or None, and count the hit or miss."""
+        try:
+            frame = self._read_sheet(self._sheet_path(digest, sheet_name))
+        except Exception:
+            # On any load error, ignore cache (acts like "miss")
+            self.misses += 1
+            return None
+        self.hits += 1
+        return frame
+
+    def put(self, digest: str, sheet_name: str, frame: pd.DataFrame) -> None:
+        """Store sheet of the workbook with the given content digest."""
+        self._write_sheet(self._sheet_path(digest, sheet_name), frame)
+
+    def _read_index(self, filepath: Path) -> dict | None:
+        try:
+            with self._index_path(filepath).open(encoding="utf-8") as f:
+                return json.load(f)
+        except Exception:
+            # On any load error, ignore cache (acts like "miss")
+            return None
+
+    def _write_index(self, filepath: Path, mtime_ns: int, size: int, digest: str, sheets: list[str] | None) -> None:
+        index = {
+            "path": str(filepath),
+            "mtime_ns": mtime_ns,
+            "size": size,
+            "sha256": digest,
+            "sheets": sheets,
+        }
+        path = self._index_path(filepath)
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        tmp_path.write_text(json.dumps(index), encoding="utf-8")
+        tmp_path.replace(path)
+
+    def _remove_sheets(self, digest: str) -> None:
+        for path in self.cache_dir.glob(f"{digest}-*.sheet"):
+            try:
+                path.unlink(missing_ok=True)
+            except OSError:
+                # Still mapped by another process on some platforms
+                pass
+
+    @staticmethod
+    def _write_sheet(path: Path, frame: pd.DataFrame) -> None:
+        """Write frame to path as a protocol 5 pickle with aligned out-of-band buffers."""
+        buffers = []
+        data = pickle.dumps(frame, protocol=5, buffer_callback=buffers.append)
+        raw_buffers = [buffer.raw() for buffer in buffers]
+        offset = _HEADER.size + _BUFFER.size * len(raw_buffers) + len(data)
+        table = []
+        for raw in raw_buffers:
+            offset += -offset % _ALIGN
+            table.append((offset, raw.nbytes))
+            offset += raw.nbytes
+
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        with tmp_path.open("wb") as f:
+            f.write(_HEADER.pack(len(data), len(raw_buffers)))
+            for entry in table:
+                f.write(_BUFFER.pack(*entry))
+            f.write(data)
+            for (start, _), raw in zip(table, raw_buffers):
+                f.write(b"\0" * (start - f.tell()))
+                f.write(raw)
+        tmp_path.replace(path)
+
+    @staticmethod
+    def _read_sheet(path: Path) -> pd.DataFrame:
+        """
+        Read a sheet file written by _write_sheet, with its buffers memory mapped copy-on-write.
+
+        The file is unpickled, so it is trusted like code: see the class docstring.
+        """
+        with path.open("rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+        view = memoryview(mapped)
+        length, count = _HEADER.unpack_from(view)
+        table = [_BUFFER.unpack_from(view, _HEADER.size + _BUFFER.size * i) for i in range(count)]
+        start = _HEADER.size + _BUFFER.size * count
+        return pickle.loads(view[start:start + length], buffers=[view[o:o + n] for o, n in table])
+
+    def stats(self) -> dict[str, int]:
+        """Return hit and miss counters of sheet lookups."""
+        return {"hits": self.hits, "misses": self.misses}
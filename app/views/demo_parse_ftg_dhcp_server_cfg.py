@@ -1,4 +1,5 @@
 import json
+import sys
 from app.cli_parsers.parsers import parse_fortigate_config
 
 CFG_FILE = 'app/test_output_configs/brussels.cfg'
@@ -8,4 +9,6 @@ config_tree = parse_fortigate_config(CFG_FILE, DISSECTOR_FILE)
 
 
 def run():
-    print(json.dumps(config_tree, indent=4))
+    # json.dump writes chunks as they are encoded instead of one large string
+    json.dump(config_tree, sys.stdout, indent=4)
+    print()
@@ -13,6 +13,14 @@ SITE = 'BRUSSELS'
 
 # Loads test data from an Excel file.
 dhcp_info_queries = DhcpInfoQueries('app/src/mock_data/dhcp_info_mock.xlsx')
+
+# Checks the whole workbook before anything is rendered. Rows the queries skip are only reported.
+problems = dhcp_info_queries.validate()
+if problems:
+    raise ValueError("Invalid DHCP info workbook:\n" + "\n".join(problems))
+for warning in dhcp_info_queries.get_skipped_rows():
+    print(f"Warning: {warning}")
+
 dhcp_info_data = dhcp_info_queries.get_dhcp_info_data(site_name=SITE)
 
 # Loads Meraki test data
@@ -0,0 +1,258 @@
+"""Benchmark confparser on generated FortiGate, Cisco and VSP configs.
+
+Usage:
+    python benchmarks/confparser/bench_confparser.py
+    python benchmarks/confparser/bench_confparser.py --sizes 1000 10000 100000 1000000
+    python benchmarks/confparser/bench_confparser.py --sizes 100000 1000000 --extra-rules 0 --mmap
+    python benchmarks/confparser/bench_confparser.py --check benchmarks/confparser/results/<earlier>.json
+
+For every dialect and size a config is generated into a temporary directory
+and parsed with the dialect's dissector and with a large version of it that
+has --extra-rules rules added to every block. The results are written to a
+JSON file in benchmarks/confparser/results unless --output is given. With
+--mmap every case is also parsed from a memory mapped file, which is reported
+as mmap lines/sec next to the text mode result.
+
+With --check the exit status is 1 when a default parse with the base dissector
+is not clearly faster than building the same tree from the event stream, or, if
+an earlier results file is given, when a case lost more than --tolerance of its
+lines/sec.
+"""
+import argparse
+import gc
+import json
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[2]  # repo root (two levels up from benchmarks/confparser)
+HERE = Path(__file__).resolve().parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(HERE))
+
+from app.cli_parsers.confparser import Dissector, build_tree  # noqa: E402
+from generators import GENERATORS, large_dissector, write_config  # noqa: E402
+
+# ---- config ----
+DIALECTS = {
+    "fortigate": (ROOT / "app/templates/fortigate/fortigate_dissector.yaml", {"indent": 4, "eof": None}),
+    "cisco": (HERE / "dissectors/cisco_ios.yaml", {}),
+    "vsp": (HERE / "dissectors/extreme_vsp.yaml", {"indent": 0, "eob": "exit"}),
+}
+RESULTS_DIR = HERE / "results"
+MIN_EVENTS_RATIO = 1.1  # event stream + build_tree must take this much longer than a base dissector parse
+# ---------------
+
+
+class _CountingWriter:
+    """Text stream that only counts the characters written to it."""
+
+    def __init__(self) -> None:
+        self.size = 0
+
+    def write(self, text: str) -> None:
+        self.size += len(text)
+
+
+def _count_nodes(tree: dict) -> tuple[int, int]:
+    """Return the number of branches and leaf values in ``tree``."""
+    branches, leaves = 0, 0
+    seen = set()
+    stack = [tree]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, dict):
+            # Branches referenced by several keys are counted once
+            if id(value) in seen:
+                continue
+            seen.add(id(value))
+            branches += 1
+            stack.extend(value.values())
+        elif isinstance(value, list):
+            stack.extend(value)
+        else:
+            leaves += 1
+    return branches, leaves
+
+
+def bench_one(dissector: Dissector, path: Path, lines: int, kwargs: dict, repeat: int, use_mmap: bool) -> dict:
+    """Parse ``path`` and return throughput, peak memory and tree size."""
+    timings = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        tree = dissector.parse_file(path, **kwargs)
+        timings.append(time.perf_counter() - start)
+        del tree
+    best = min(timings)
+
+    # The default parse builds the tree directly and must beat replaying events
+    events_timings = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        tree = build_tree(dissector.iter_events_file(path, **kwargs))
+        events_timings.append(time.perf_counter() - start)
+        del tree
+
+    # Separate run because tracing allocations slows parsing down
+    gc.collect()
+    tracemalloc.start()
+    tree = dissector.parse_file(path, **kwargs)
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    mmap = {}
+    if use_mmap:
+        # Memory mapped files are matched as bytes and must give the same tree
+        if dissector.parse_file(path, use_mmap=True, **kwargs) != tree:
+            raise AssertionError(f"parse_file(use_mmap=True) of {path.name} differs from text mode")
+        mmap_timings = []
+        for _ in range(repeat):
+            gc.collect()
+            start = time.perf_counter()
+            dissector.parse_file(path, use_mmap=True, **kwargs)
+            mmap_timings.append(time.perf_counter() - start)
+        mmap_best = min(mmap_timings)
+        gc.collect()
+        tracemalloc.start()
+        dissector.parse_file(path, use_mmap=True, **kwargs)
+        mmap_peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        mmap = {
+            "mmap_seconds": round(mmap_best, 6),
+            "mmap_lines_per_sec": round(lines / mmap_best) if mmap_best else None,
+            "mmap_peak_memory_bytes": mmap_peak,
+        }
+
+    writer = _CountingWriter()
+    tree.dump(writer)
+    branches, leaves = _count_nodes(tree)
+    return {
+        "seconds": round(best, 6),
+        "seconds_all": [round(t, 6) for t in timings],
+        "lines_per_sec": round(lines / best) if best else None,
+        "events_seconds": round(min(events_timings), 6),
+        "peak_memory_bytes": peak,
+        "tree_memory_bytes": retained,
+        "tree_branches": branches,
+        "tree_leaves": leaves,
+        "tree_json_chars": writer.size,
+        **mmap,
+    }
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000],
+                        help="number of config lines to generate (default: 1000 10000 100000)")
+    parser.add_argument("--dialects", nargs="+", choices=sorted(DIALECTS), default=sorted(DIALECTS))
+    parser.add_argument("--extra-rules", type=int, default=100,
+                        help="rules added to every block of the large dissector, 0 to skip it")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per case, the best one is reported")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path, help="JSON file to write the results to")
+    parser.add_argument("--check", nargs="?", const=True, type=Path, metavar="BASELINE",
+                        help="exit with status 1 on a performance regression, optionally against an earlier results file")
+    parser.add_argument("--tolerance", type=float, default=0.15,
+                        help="fraction of lines/sec a case may lose against BASELINE (default: 0.15)")
+    parser.add_argument("--mmap", action="store_true",
+                        help="also parse every case from a memory mapped file with bytes regexes")
+    args = parser.parse_args()
+
+    results = []
+    print(f"{'dialect':10} {'dissector':10} {'lines':>9} {'lines/s':>10} {'peak MiB':>9} {'tree MiB':>9} {'branches':>9}"
+          + (f" {'mmap l/s':>10} {'mmap MiB':>9}" if args.mmap else ""))
+    with tempfile.TemporaryDirectory() as tmp:
+        for dialect in args.dialects:
+            dissector_path, kwargs = DIALECTS[dialect]
+            dissectors = {"base": Dissector.from_file(dissector_path)}
+            if args.extra_rules:
+                dissectors["large"] = Dissector(large_dissector(dissector_path, args.extra_rules))
+            for size in args.sizes:
+                path = Path(tmp) / f"{dialect}-{size}.cfg"
+                lines = write_config(path, GENERATORS[dialect], size, args.seed)
+                for label, dissector in dissectors.items():
+                    result = bench_one(dissector, path, lines, kwargs, args.repeat, args.mmap)
+                    result.update({
+                        "dialect": dialect,
+                        "dissector": label,
+                        "dissector_rules": _count_rules(dissector.context),
+                        "lines": lines,
+                        "bytes": path.stat().st_size,
+                    })
+                    results.append(result)
+                    print(f"{dialect:10} {label:10} {lines:9} {result['lines_per_sec']:10} "
+                          f"{result['peak_memory_bytes'] / 2**20:9.1f} {result['tree_memory_bytes'] / 2**20:9.1f} "
+                          f"{result['tree_branches']:9}"
+                          + (f" {result['mmap_lines_per_sec']:10} {result['mmap_peak_memory_bytes'] / 2**20:9.1f}"
+                             if args.mmap else ""))
+                path.unlink()
+
+    report = {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "git_commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": args.repeat,
+        "seed": args.seed,
+        "results": results,
+    }
+    output = args.output
+    if output is None:
+        RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+        output = RESULTS_DIR / f"confparser-{datetime.now():%Y%m%d-%H%M%S}.json"
+    output.write_text(json.dumps(report, indent=2), encoding="utf-8")
+    print(f"[OK] wrote {output}")
+
+    if not args.check:
+        return 0
+    baseline = None
+    if isinstance(args.check, Path):
+        baseline = json.loads(args.check.read_text(encoding="utf-8"))["results"]
+    failures = check_results(results, baseline, args.tolerance)
+    for failure in failures:
+        print(f"[FAIL] {failure}")
+    if not failures:
+        print("[OK] no performance regressions")
+    return 1 if failures else 0
+
+
+def check_results(results: list[dict], baseline: list[dict] | None, tolerance: float) -> list[str]:
+    """Return descriptions of cases that regressed, see --check."""
+    failures = []
+    earlier = {(r["dialect"], r["dissector"], r["lines"]): r for r in baseline or []}
+    for result in results:
+        case = f"{result['dialect']} {result['dissector']} {result['lines']} lines"
+        # Regexes of the large dissector dominate its time, which hides the cost of building the tree
+        ratio = result["events_seconds"] / result["seconds"]
+        if result["dissector"] == "base" and ratio < MIN_EVENTS_RATIO:
+            failures.append(f"{case}: parse is only {ratio:.2f}x faster than build_tree(iter_events), "
+                            f"expected {MIN_EVENTS_RATIO}x")
+        base = earlier.get((result["dialect"], result["dissector"], result["lines"]))
+        if base and result["lines_per_sec"] < base["lines_per_sec"] * (1 - tolerance):
+            failures.append(f"{case}: {result['lines_per_sec']} lines/s, was {base['lines_per_sec']} lines/s")
+    return failures
+
+
+def _count_rules(block: list) -> int:
+    """Return the number of items in a compiled dissector and its child blocks."""
+    return sum(1 + (_count_rules(item["child"]) if "child" in item else 0) for item in block)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,170 @@
+"""Synthetic configuration generators for the confparser benchmarks.
+
+Every generator yields lines until roughly ``lines`` lines were produced and
+always closes the blocks it opened, so the output is a well formed config.
+The output only depends on ``lines`` and ``seed``.
+"""
+import random
+from pathlib import Path
+from typing import Callable, Iterator
+
+
+def fortigate(lines: int, seed: int = 0) -> Iterator[str]:
+    """Yield a FortiGate style config (indent=4, edit/next/end blocks).
+
+    Most lines are DHCP server scopes, which fortigate_dissector.yaml parses.
+    Every tenth block is a firewall address object that it has to skip, so
+    the config has several top level "end" lines (parse it with eof=None).
+    """
+    rnd = random.Random(seed)
+    count = 0
+    yield "config system dhcp server"
+    count += 1
+    scope = 0
+    while count < lines:
+        scope += 1
+        net = f"10.{scope // 250 % 250}.{scope % 250}"
+        block = [
+            f"    edit {scope}",
+            f"        set default-gateway {net}.1",
+            "        set netmask 255.255.255.0",
+            f'        set interface "vlan{scope}"',
+            f"        set dns-server1 10.0.0.{rnd.randint(1, 9)}",
+            f"        set dns-server2 10.0.1.{rnd.randint(1, 9)}",
+            "        config ip-range",
+            "            edit 1",
+            f"                set start-ip {net}.10",
+            f"                set end-ip {net}.200",
+            "            next",
+            "        end",
+            "        config options",
+        ]
+        for option in range(1, rnd.randint(2, 4)):
+            block += [
+                f"            edit {option}",
+                f"                set code {rnd.choice((42, 66, 150, 252))}",
+                "                set type ip",
+                f"                set ip 10.0.2.{option}",
+                "            next",
+            ]
+        block += ["        end", "        config reserved-address"]
+        for reservation in range(1, rnd.randint(2, 6)):
+            block += [
+                f"            edit {reservation}",
+                f"                set ip {net}.{reservation + 1}",
+                f"                set mac 00:09:0f:{scope % 256:02x}:{reservation:02x}:01",
+                f'                set description "host{reservation}"',
+                "            next",
+            ]
+        block += ["        end", "    next"]
+        if scope % 10 == 0:
+            # Block that the dissector does not know about
+            block += [
+                "end",
+                "config firewall address",
+                f'    edit "net{scope}"',
+                f"        set subnet {net}.0 255.255.255.0",
+                "    next",
+                "end",
+                "config system dhcp server",
+            ]
+        yield from block
+        count += len(block)
+    yield "end"
+
+
+def cisco(lines: int, seed: int = 0) -> Iterator[str]:
+    """Yield a Cisco IOS style config (indent=1, '!' separators)."""
+    rnd = random.Random(seed)
+    yield from ["hostname CORE-01", "!", "version 15.2", "!"]
+    count = 4
+    n = 0
+    while count < lines:
+        n += 1
+        net = f"10.{n // 250 % 250}.{n % 250}"
+        block = [
+            f"interface GigabitEthernet{n // 48}/0/{n % 48}",
+            f" description uplink {n}",
+            f" ip address {net}.1 255.255.255.0",
+            f" switchport trunk allowed vlan {rnd.randint(1, 9)}-{rnd.randint(10, 99)},100",
+            " shutdown" if rnd.random() < 0.2 else " no shutdown",
+            f" standby 1 ip {net}.254",
+            " ip helper-address 10.0.0.5",
+            "!",
+            f"ip route {net}.0 255.255.255.0 10.0.0.{rnd.randint(1, 9)}",
+            f"access-list {100 + n % 20} permit ip {net}.0 0.0.0.255 any",
+            f"access-list {100 + n % 20} deny ip host {net}.99 any",
+            f"vlan {n % 4000 + 1}",
+            f" name VLAN{n % 4000 + 1}",
+            "!",
+        ]
+        if n % 25 == 0:
+            block += [
+                f"object-group network OG{n}",
+                f" host {net}.7",
+                f" network-object {net}.0 255.255.255.0",
+                "!",
+            ]
+        yield from block
+        count += len(block)
+    yield from ["line vty 0 4", " transport input ssh", "!", "end"]
+
+
+def vsp(lines: int, seed: int = 0) -> Iterator[str]:
+    """Yield an Extreme VSP style config (indent=0, eob='exit')."""
+    rnd = random.Random(seed)
+    yield from ['snmp-server name "VSP-01"', "router isis", "spbm 1 b-vid 4051,4052 primary 4051", "exit"]
+    count = 4
+    n = 0
+    while count < lines:
+        n += 1
+        block = [
+            f"interface gigabitEthernet {n // 48 + 1}/{n % 48 + 1}",
+            f'name "port {n}"',
+            "encapsulation dot1q",
+            "no shutdown" if rnd.random() < 0.9 else "shutdown",
+            "exit",
+            f'vlan create {n % 4000 + 2} name "V{n}" type port-mstprstp 0',
+        ]
+        yield from block
+        count += len(block)
+
+
+GENERATORS: dict[str, Callable[..., Iterator[str]]] = {
+    "fortigate": fortigate,
+    "cisco": cisco,
+    "vsp": vsp,
+}
+
+
+def write_config(path: str | Path, generator: Callable[..., Iterator[str]], lines: int, seed: int = 0) -> int:
+    """Write a generated config to ``path`` and return the number of lines."""
+    count = 0
+    with open(path, "w", encoding="ascii", newline="\n") as f:
+        for line in generator(lines, seed):
+            f.write(line + "\n")
+            count += 1
+    return count
+
+
+def large_dissector(path: str | Path, extra_rules: int) -> str:
+    """Return the dissector at ``path`` with ``extra_rules`` rules added to each block.
+
+    The extra rules never match the generated configs. They only make the
+    dissector larger, like one that covers many features of an OS.
+    """
+    text = Path(path).read_text()
+    lines = text.splitlines()
+    result = []
+    for line in lines:
+        result.append(line)
+        stripped = line.lstrip()
+        if stripped.startswith("child:"):
+            # Items of a child block are at the indentation of its key
+            indent = " " * (len(line) - len(stripped))
+            for i in range(extra_rules):
+                result.append(f"{indent}- match: set unused-option-{i} (?P<unused_{i}>.*)")
+    for i in range(extra_rules):
+        result.append(f"- match: config unused section {i}")
+        result.append(f"  name: unused_{i}")
+    return "\n".join(result) + "\n"
@@ -0,0 +1,356 @@
+"""Check that every confparser parse path gives the same Tree as a plain reference parser.
+
+Usage:
+    python tests/confparser/check_equivalence.py
+    python tests/confparser/check_equivalence.py --dissectors 300 --edits 90 --seed 7 --timing-lines 0
+
+The reference parser below works like confparser did before the dispatch index,
+the event stream, the memoized actions and the in place list appends: it tries
+every item of a block on every line, runs actions by name and concatenates
+lists. Random dissectors and documents are parsed with it and with parse_str,
+build_tree(iter_events_str), compact parse_str, MultiDissector,
+parse_str_incremental and parse_file(use_mmap=True). The bundled FortiGate, Cisco and VSP dissectors then
+parse generated configs through a chain of random edits, where every
+incremental parse must equal a full parse of the edited text and leave the
+previous Tree as it was. Finally, re-parsing a one line edit of a large config
+must be faster than a full parse.
+"""
+import argparse
+import itertools
+import json
+import random
+import sys
+import tempfile
+import timeit
+from pathlib import Path
+
+import yaml
+
+ROOT = Path(__file__).resolve().parents[2]  # repo root (two levels up from tests/confparser)
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "benchmarks" / "confparser"))
+
+from app.cli_parsers.confparser import confparser  # noqa: E402
+from generators import GENERATORS  # noqa: E402
+
+# ---- config ----
+DIALECTS = {
+    "fortigate": (ROOT / "app/templates/fortigate/fortigate_dissector.yaml", {"indent": 4, "eof": None}),
+    "cisco": (ROOT / "benchmarks/confparser/dissectors/cisco_ios.yaml", {}),
+    "vsp": (ROOT / "benchmarks/confparser/dissectors/extreme_vsp.yaml", {"indent": 0, "eob": "exit"}),
+}
+CONFIG_LINES = 3_000
+TIMING_LINES = 100_000
+WORDS = ["interface", "ip", "address", "vlan", "set", "edit", "no", "shutdown", "name", "port", "a", ""]
+VALUES = ["1", "2-4", "1,3-5", "10.0.0.1 255.255.255.0", "10.1.0.0/16", "0822455D0A16", "x y z", "eth0"]
+ACTIONS = [None, None, "split", "list", "bool", "expand", "cidr", "cidr_l", "decrypt7", "expand_h"]
+# ---------------
+
+
+class ReferenceTree(dict):
+    """Autovivifying dict that merges values like confparser originally did."""
+
+    def __missing__(self, key):
+        value = self[key] = ReferenceTree()
+        return value
+
+    def merge_retain(self, other):
+        for key in other.keys():
+            if key in self:
+                value = other[key] if isinstance(other[key], list) else [other[key]]
+                if isinstance(self[key], list):
+                    self[key] = self[key] + value
+                else:
+                    self[key] = [self[key]] + value
+            else:
+                self[key] = other[key]
+
+
+def reference_action(method, value):
+    """Run an action by name, without the memo of the compiled dissector."""
+    if method is None or value is None:
+        return value
+    func = confparser._actions.get(method)
+    if func is None:
+        return value
+    return func.func(value) if isinstance(func, confparser._Memo) else func(value)
+
+
+def reference_parse(context, lines, indent=1, eob=None, eof="end"):
+    """Parse lines by trying every item of the current block, like the original _parse."""
+    result = ReferenceTree()
+    r_stack, c_stack, level = [result], [context], 0
+    for line in lines:
+        line = line.rstrip()
+        if not line.strip():
+            continue
+        if line == eof:
+            break
+        while level and not line.startswith(" " * indent * level):
+            level -= 1
+            c_stack.pop()
+            r_stack.pop()
+        if eob and level and line.strip() == eob:
+            level -= 1
+            c_stack.pop()
+            r_stack.pop()
+        for item in c_stack[-1]:
+            text = line[indent * level:]
+            m = item["prog"].match(text) if "match" in item else item["prog"].search(text)
+            if not m:
+                continue
+            named_groups = {k: reference_action(item.get("actionall"), v)
+                            for k, v in m.groupdict().items() if v is not None}
+            p_result = r_stack[-1][item["parent"]] if "parent" in item else r_stack[-1]
+            if "key" in item:
+                tree = named_groups
+                for idx in range(m.re.groups, 0, -1):
+                    if idx in m.re.groupindex.values() or idx == item["key"]:
+                        continue
+                    key = reference_action(item.get("actionall"), m.group(idx))
+                    key = [key] if not isinstance(key, list) else key
+                    tree = {k: tree for k in key} if tree else key[0]
+                key = reference_action(item.get("action"), m.group(item["key"]))
+                for k in [key] if not isinstance(key, list) else key:
+                    if isinstance(tree, dict):
+                        p_result[k].merge_retain(tree)
+                    elif k in p_result and isinstance(p_result[k], ReferenceTree):
+                        p_result[k].merge_retain({tree: {}})
+                    else:
+                        p_result.merge_retain({k: tree})
+                continue
+            key = m.group(0) if not m.lastindex else None
+            if m.re.groups > len(m.re.groupindex):
+                key = m.group(next(x for x in itertools.count(1) if x not in m.re.groupindex.values()))
+            if "child" in item:
+                key = reference_action(item.get("action"), item.get("name", key))
+                key = [key] if not isinstance(key, list) else key
+                r_stack.append(p_result[key[0]])
+                c_stack.append(item["child"])
+                level += 1
+                p_result[key[0]].merge_retain(named_groups)
+                for k in key[1:]:
+                    p_result[k] = p_result[key[0]]
+            elif "name" in item:
+                named_groups.update({item["name"]: reference_action(item.get("action"), item.get("value", key))})
+                p_result.merge_retain(named_groups)
+            elif "value" in item:
+                key = reference_action(item.get("action"), key)
+                for k in [key] if not isinstance(key, list) else key:
+                    named_groups.update({k: item["value"]})
+                p_result.merge_retain(named_groups)
+            elif key:
+                key = reference_action(item.get("action"), key)
+                for k in [key] if not isinstance(key, list) else key:
+                    if item.get("grouping") == "implicit":
+                        p_result.merge_retain({k: named_groups})
+                    elif item.get("grouping") == "explicit":
+                        p_result[k] = p_result.get(k, []) + [named_groups]
+                    else:
+                        p_result[k].merge_retain(named_groups)
+            else:
+                p_result.merge_retain(named_groups)
+    return result
+
+
+def random_pattern(rnd: random.Random) -> str:
+    """Return a regex of literal words followed by unnamed or named groups."""
+    words = [rnd.choice(WORDS) for _ in range(rnd.randint(1, 2))]
+    tail = rnd.choice(["", " (\\S+)", " (.*)", " (?P<v>\\S+)", " (\\S+) (?P<w>.*)", " (\\S+) (\\S+)", "\\S*", " ?(.*)",
+                       " (?<=\\S )(\\S+)", "(?<! )(\\S*)$"])
+    # Anchors and lookbehinds must not see the indentation of the line
+    return ("^" if rnd.random() < 0.1 else "") + " ".join(words) + tail
+
+
+def random_block(rnd: random.Random, depth: int) -> list[dict]:
+    """Return the items of a random dissector block."""
+    items = []
+    for _ in range(rnd.randint(1, 6)):
+        item = {"search" if rnd.random() < 0.1 else "match": random_pattern(rnd)}
+        if depth < 2 and rnd.random() < 0.3:
+            item["child"] = random_block(rnd, depth + 1)
+            if rnd.random() < 0.2:
+                item["name"] = rnd.choice(WORDS[:5])
+        else:
+            roll = rnd.random()
+            if roll < 0.15:
+                item["name"] = rnd.choice(WORDS[:5])
+            elif roll < 0.25:
+                item["value"] = rnd.choice(VALUES)
+            elif roll < 0.35:
+                item["key"] = 1
+            elif roll < 0.5:
+                item["grouping"] = rnd.choice(["implicit", "explicit"])
+        if rnd.random() < 0.15:
+            item["parent"] = rnd.choice(WORDS[:5])
+        for option in ("action", "actionall"):
+            action = rnd.choice(ACTIONS)
+            if action:
+                item[option] = action
+        items.append(item)
+    return items
+
+
+def random_document(rnd: random.Random, indent: int) -> list[str]:
+    """Return lines of random words and values at random block levels."""
+    lines = []
+    for _ in range(rnd.randint(5, 60)):
+        words = [rnd.choice(WORDS + VALUES) for _ in range(rnd.randint(1, 4))]
+        lines.append(" " * indent * rnd.randint(0, 2) + " ".join(words))
+    return lines
+
+
+def parents_ok(branch) -> bool:
+    """Return whether every branch below branch refers to the branch that holds it."""
+    for value in branch.values():
+        for v in value if isinstance(value, list) else [value]:
+            if isinstance(v, confparser.Tree) and (v.parent is not branch or not parents_ok(v)):
+                return False
+    return True
+
+
+def _outcome(parse):
+    """Return the compact JSON of a parse, or the type of its exception."""
+    try:
+        return json.dumps(parse(), separators=(",", ":"), default=repr)
+    except Exception as e:
+        return f"raises {type(e).__name__}"
+
+
+def check_random(count: int, seed: int) -> list[str]:
+    """Return differences found for random dissectors and documents."""
+    failures = []
+    mapped = Path(tempfile.mkdtemp()) / "config.txt"
+    for case in range(count):
+        rnd = random.Random(seed * 1_000_003 + case)
+        text = yaml.safe_dump(random_block(rnd, 0))
+        dissector = confparser.Dissector(text)
+        kwargs = rnd.choice([{}, {"indent": 2}, {"indent": 0, "eob": "exit"}])
+        lines = random_document(rnd, kwargs.get("indent", 1) or 1)
+        if "eob" in kwargs:
+            lines = [line.strip() for line in lines]
+            lines.insert(rnd.randint(0, len(lines)), "exit")
+        string = "\n".join(lines)
+        previous = "\n".join(random_edit(rnd, lines, kwargs.get("indent", 1)))
+        mapped.write_text(string + "\n", newline=rnd.choice(["\n", "\r\n"]))
+        if dissector.context.binary is None:
+            failures.append(f"random case {case}: dissector cannot be matched as bytes\n{text}")
+        expected = _outcome(lambda: reference_parse(dissector.context, iter(lines), **kwargs))
+        results = {
+            "parse_str": lambda: dissector.parse_str(string, **kwargs),
+            "build_tree(iter_events_str)": lambda: confparser.build_tree(dissector.iter_events_str(string, **kwargs)),
+            "parse_str(compact=True)": lambda: dissector.parse_str(string, compact=True, **kwargs),
+            "MultiDissector": lambda: confparser.MultiDissector([dissector, dissector]).parse_str(string, **kwargs)[1],
+            "parse_str_incremental": lambda: dissector.parse_str_incremental(string, **kwargs),
+            "parse_str_incremental(previous)": lambda: dissector.parse_str_incremental(
+                string, dissector.parse_str_incremental(previous, **kwargs), **kwargs),
+            "parse_file(use_mmap=True)": lambda: dissector.parse_file(mapped, use_mmap=True, **kwargs),
+            "build_tree(iter_events_file(use_mmap=True))": lambda: confparser.build_tree(
+                dissector.iter_events_file(mapped, use_mmap=True, **kwargs)),
+        }
+        for name, parse in results.items():
+            got = _outcome(parse)
+            if got != expected:
+                failures.append(f"random case {case} ({name}): {got[:200]} != {expected[:200]}\n{text}{string}")
+        if not expected.startswith("raises"):
+            old = dissector.parse_str_incremental(previous, **kwargs)
+            before = json.dumps(old, default=repr)
+            tree = dissector.parse_str_incremental(string, old, **kwargs)
+            if json.dumps(old, default=repr) != before or not parents_ok(tree):
+                failures.append(f"random case {case}: incremental parse changed the previous Tree or has stale parents")
+    return failures
+
+
+def random_edit(rnd: random.Random, lines: list[str], indent: int) -> list[str]:
+    """Return lines with a random top level block deleted, copied, moved or changed."""
+    starts = [i for i, line in enumerate(lines) if line.strip() and not line.startswith(" " * max(indent, 1))]
+    if not starts:
+        return lines
+    pos = rnd.randrange(len(starts))
+    start = starts[pos]
+    end = starts[pos + 1] if pos + 1 < len(starts) else len(lines)
+    block = lines[start:end]
+    rest = lines[:start] + lines[end:]
+    roll = rnd.random()
+    if roll < 0.25:
+        return rest
+    if roll < 0.5:
+        return lines[:end] + block + lines[end:]
+    if roll < 0.75:
+        at = rnd.choice([i for i, line in enumerate(rest) if not line.startswith(" ")] or [0])
+        return rest[:at] + block + rest[at:]
+    changed = list(block)
+    row = rnd.randrange(len(changed))
+    changed[row] = changed[row].rstrip() + rnd.choice(["0", " 1", "x"])
+    return lines[:start] + changed + lines[end:]
+
+
+def check_incremental(edits: int, seed: int) -> list[str]:
+    """Return differences between incremental and full parses along chains of edits."""
+    failures = []
+    per_dialect = max(1, edits // len(DIALECTS))
+    for dialect, (path, kwargs) in DIALECTS.items():
+        rnd = random.Random(seed)
+        dissector = confparser.Dissector.from_file(path)
+        lines = list(GENERATORS[dialect](CONFIG_LINES, seed))
+        tree = dissector.parse_str_incremental("\n".join(lines), **kwargs)
+        for step in range(per_dialect):
+            lines = random_edit(rnd, lines, kwargs.get("indent", 1))
+            string = "\n".join(lines)
+            before = json.dumps(tree)
+            old, tree = tree, dissector.parse_str_incremental(string, tree, **kwargs)
+            expected = dissector.parse_str(string, **kwargs)
+            if json.dumps(tree) != json.dumps(expected):
+                failures.append(f"{dialect} edit {step}: incremental parse differs from full parse")
+                break
+            if json.dumps(old) != before or not parents_ok(tree):
+                failures.append(f"{dialect} edit {step}: incremental parse changed the previous Tree or has stale parents")
+                break
+    return failures
+
+
+def check_timing(count: int, seed: int) -> list[str]:
+    """Return dialects where re-parsing a one line edit is not faster than a full parse."""
+    failures = []
+    for dialect, (path, kwargs) in DIALECTS.items():
+        dissector = confparser.Dissector.from_file(path)
+        lines = list(GENERATORS[dialect](count, seed))
+        tree = dissector.parse_str_incremental("\n".join(lines), **kwargs)
+        # Change a line in the middle of a block that does not close it
+        row = len(lines) // 2
+        while not lines[row].startswith(" ") and kwargs.get("indent", 1) or lines[row].strip() == "exit":
+            row += 1
+        lines[row] += "0"
+        string = "\n".join(lines)
+        full = min(timeit.repeat(lambda: dissector.parse_str(string, **kwargs), number=1, repeat=3))
+        incremental = min(timeit.repeat(lambda: dissector.parse_str_incremental(string, tree, **kwargs),
+                                        number=1, repeat=3))
+        if incremental >= full:
+            failures.append(f"{dialect}: re-parsing a one line edit of {count} lines took {incremental:.2f}s, "
+                            f"a full parse {full:.2f}s")
+    return failures
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--dissectors", type=int, default=3_000, help="random dissectors to check (default: 3000)")
+    parser.add_argument("--edits", type=int, default=720, help="chained edits over all dialects (default: 720)")
+    parser.add_argument("--timing-lines", type=int, default=TIMING_LINES,
+                        help=f"config lines of the timing check, 0 to skip (default: {TIMING_LINES})")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    failures = check_random(args.dissectors, args.seed) + check_incremental(args.edits, args.seed)
+    if args.timing_lines:
+        failures += check_timing(args.timing_lines, args.seed)
+    if failures:
+        for failure in failures[:10]:
+            print(f"[DIFF] {failure}")
+        print(f"[DIFF] {len(failures)} differences")
+        return 1
+    print(f"[OK] {args.dissectors} random dissectors and {args.edits} edits give the same trees")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
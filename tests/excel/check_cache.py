@@ -0,0 +1,99 @@
+"""Smoke test of the Excel disk cache and of max_memory eviction in BaseExcelDataLoader.
+
+Usage:
+    python tests/excel/check_cache.py
+
+Workbooks are written to a temporary directory. A workbook is loaded twice to
+check that the second load is served from the disk cache, then changed on disk
+to check that the cache is invalidated and the new data is read. Finally, a
+loader with a small max_memory must keep a single sheet in memory and read
+evicted sheets again with the same data.
+"""
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parents[2]  # repo root (two levels up from tests/excel)
+sys.path.insert(0, str(ROOT))
+
+from app.models.excel_models.base_excel_data_loader import BaseExcelDataLoader  # noqa: E402
+
+
+def write_workbook(path: Path, sheets: dict[str, pd.DataFrame]) -> None:
+    with pd.ExcelWriter(path) as writer:
+        for name, frame in sheets.items():
+            frame.to_excel(writer, sheet_name=name, index=False)
+
+
+def check(condition: bool, message: str, failures: list[str]) -> None:
+    print(f"[{'OK' if condition else 'FAIL'}] {message}")
+    if not condition:
+        failures.append(message)
+
+
+def check_invalidation(tmp: Path, failures: list[str]) -> None:
+    path = tmp / "sites.xlsx"
+    cache_dir = tmp / "cache"
+    first = pd.DataFrame({"site": ["BRUSSELS", "GHENT"], "vlan": [10, 20]})
+    write_workbook(path, {"Site": first})
+
+    loader = BaseExcelDataLoader(path, cache_dir=cache_dir)
+    pd.testing.assert_frame_equal(loader.get_dataframe_from_sheet("Site"), first)
+    check(loader._cache.misses == 1, "first read is a cache miss", failures)
+
+    loader = BaseExcelDataLoader(path, cache_dir=cache_dir)
+    frame = loader.get_dataframe_from_sheet("Site")
+    check(loader._cache.hits == 1 and loader._excel_file is None,
+          "unchanged workbook is served from the cache without opening it", failures)
+    check(frame.equals(first), "cached sheet equals the workbook", failures)
+
+    second = pd.DataFrame({"site": ["BRUSSELS", "GHENT", "LIEGE"], "vlan": [10, 20, 30]})
+    write_workbook(path, {"Site": second, "Extra": first})
+    # Keep the mtime of the first version, so only the size and content tell the change
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    loader.load()
+    frame = loader.get_dataframe_from_sheet("Site")
+    check(loader._cache.misses == 1, "changed workbook is a cache miss", failures)
+    check(frame.equals(second), "changed workbook gives the new data", failures)
+    check(loader.sheet_names == ["Site", "Extra"], "changed workbook gives the new sheet names", failures)
+
+
+def check_eviction(tmp: Path, failures: list[str]) -> None:
+    path = tmp / "big.xlsx"
+    sheets = {f"Sheet{i}": pd.DataFrame({"name": [f"row {i}-{n}" for n in range(200)]}) for i in range(3)}
+    write_workbook(path, sheets)
+    sizes = [int(frame.memory_usage(deep=True).sum()) for frame in sheets.values()]
+
+    loader = BaseExcelDataLoader(path, cache_dir=None, max_memory=max(sizes) * 3 // 2)
+    for name, expected in sheets.items():
+        check(loader.get_dataframe_from_sheet(name).equals(expected), f"{name} is read", failures)
+    usage = loader.memory_usage()
+    check(usage["sheets"] == 1 and usage["size"] <= loader.max_memory,
+          f"max_memory keeps one sheet in memory ({usage})", failures)
+    check(list(loader._dfs) == [("Sheet2", None)], "least recently used sheets are evicted", failures)
+    check(loader.get_dataframe_from_sheet("Sheet0").equals(sheets["Sheet0"]),
+          "evicted sheet is read again with the same data", failures)
+
+    loader = BaseExcelDataLoader(path, cache_dir=None, max_memory=1)
+    loader.get_dataframe_from_sheet("Sheet0")
+    check(loader.memory_usage()["sheets"] == 1, "the last read sheet is kept even above max_memory", failures)
+
+
+def main() -> int:
+    failures: list[str] = []
+    with tempfile.TemporaryDirectory() as tmp:
+        check_invalidation(Path(tmp), failures)
+        check_eviction(Path(tmp), failures)
+    if failures:
+        print(f"[FAIL] {len(failures)} check(s) failed")
+        return 1
+    print("[OK] Excel cache smoke test passed")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())